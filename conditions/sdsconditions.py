@@ -139,8 +139,8 @@ def assert_wfcatalog_exists_condition(options, sds_file):
         The file being processed.
 
     """
-    # Extract the current metadata object from the database
-    metadata_object = mongo_pool.get_wfcatalog_daily_document(sds_file)
+    # Extract the checksums of the current metadata object from the database
+    metadata_object = mongo_pool.get_wfcatalog_daily_checksums(sds_file)
 
     # In case we don't care about the hashes, we can exit here
     if ("check_checksum" in options
@@ -304,13 +304,13 @@ def assert_ppsd_metadata_exists_condition(options, sds_file):
 
     """
 
-    # Get the existing PPSD documents for this file
-    ppsd_documents = mongo_pool.get_ppsd_documents(sds_file)
+    # Get the checksums of the existing PPSD documents for this file
+    ppsd_documents = mongo_pool.get_ppsd_checksums(sds_file)
 
     # Document exists and has the same hash: it exists
     if ppsd_documents:
         # In case we don't care about the hashes, we can exit here
-        if "check_checksum" in options and options["check_checksum"] is False:
+        if options.get("check_checksum") is False:
             logger.debug("PPSD data exists for file %s, checksum not verified."
                          % (sds_file.filename))
             return True
@@ -1,5 +1,6 @@
 import logging
 import sqlite3
+import threading
 
 from configuration import config
 from datetime import datetime
@@ -20,8 +21,10 @@ class DeletionDatabase():
 
         # Connect to (file) database
         self.logger.debug("Connecting to deletion database stored at '%s'" % config["DELETION_DB"])
-        self.conn = sqlite3.connect(config["DELETION_DB"])
+        # Rules may run in worker threads, the connection is shared behind a lock
+        self.conn = sqlite3.connect(config["DELETION_DB"], check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
 
         # Create table if not exists
         self._create_table()
@@ -61,14 +64,15 @@ class DeletionDatabase():
         Inserts a row into the deletion table, ignores if the filename is already in the table.
         """
 
-        c = self.conn.cursor()
+        with self._lock:
+            c = self.conn.cursor()
 
-        # Insert a row of data
-        c.execute("INSERT OR IGNORE INTO deletion (file, created) VALUES (?,?)",
-                  (filename, datetime.now().isoformat()))
+            # Insert a row of data
+            c.execute("INSERT OR IGNORE INTO deletion (file, created) VALUES (?,?)",
+                      (filename, datetime.now().isoformat()))
 
-        # Save (commit) the changes
-        self.conn.commit()
+            # Save (commit) the changes
+            self.conn.commit()
 
     def get_deletion_status(self):
         """
@@ -85,13 +89,27 @@ class DeletionDatabase():
     def _delete_row(self, filename):
         """Delete a row from the deletion table that matches the given filename."""
 
-        c = self.conn.cursor()
+        with self._lock:
+            c = self.conn.cursor()
 
-        # Insert a row of data
-        c.execute("DELETE FROM deletion WHERE file=?", (filename,))
+            # Insert a row of data
+            c.execute("DELETE FROM deletion WHERE file=?", (filename,))
 
-        # Save (commit) the changes
-        self.conn.commit()
+            # Save (commit) the changes
+            self.conn.commit()
+
+    def _delete_rows(self, filenames):
+        """Delete the rows from the deletion table that match the given filenames,
+        in a single transaction."""
+
+        with self._lock:
+            c = self.conn.cursor()
+
+            c.executemany("DELETE FROM deletion WHERE file=?",
+                          ((filename,) for filename in filenames))
+
+            # Save (commit) the changes
+            self.conn.commit()
 
     def add_filename(self, filename):
         """Add a filename to the deletion table.
@@ -112,6 +130,15 @@ class DeletionDatabase():
         """
         self._delete_row(sds_file.filename)
 
+    def remove_many(self, sds_files):
+        """Remove a list of files from the deletion table.
+
+        Parameters
+        ----------
+        sds_files : `list` of `SDSFile`
+        """
+        self._delete_rows([sds_file.filename for sds_file in sds_files])
+
     def add_many_files(self, file_list):
         """Add a list of files to the deletion table.
 
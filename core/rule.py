@@ -1,6 +1,35 @@
 import logging
 
 
+class BoundFunction():
+    """
+    Class BoundFunction
+    A rule or condition function with its options bound, optionally negating the result
+    """
+
+    __slots__ = ("func", "options", "negate", "name")
+
+    def __init__(self, func, options, negate=False):
+        self.func = func
+        self.options = options
+        self.negate = negate
+
+        # Name of the function, prefixed with "!" when its result is negated
+        self.name = ("!" if negate else "") + func.__name__
+
+    def __call__(self, item):
+        result = self.func(self.options, item)
+        return (not result) if self.negate else result
+
+
+def batch_rule(func):
+    """Mark a rule function as a batch rule, called with a `list` of items instead of
+    a single item."""
+
+    func.batch = True
+    return func
+
+
 class Rule():
     """
     Class Rule
@@ -16,6 +45,9 @@ class Rule():
         self.conditions = conditions
         self.name = name
 
+        # Batch rules are called with a list of items
+        self.batch = getattr(call.func, "batch", False)
+
         # Initialize logger
         self.logger = logging.getLogger("RuleManager")
 
@@ -29,19 +61,25 @@ class Rule():
         self.assert_policies(SDSFile)
 
         # Call the rule
-        self.call(SDSFile)
+        if self.batch:
+            self.call([SDSFile])
+        else:
+            self.call(SDSFile)
+
+    def apply_batch(self, sds_files):
+        """
+        Rule.apply_batch
+        Applies a given batch rule to a list of files that passed the conditions
+        """
+
+        self.call(sds_files)
 
     def assert_policies(self, sds_file):
         """Assert whether all conditions evaluate to True."""
 
         # Go over each configured condition and assert the condition evaluates to True
         for condition in self.conditions:
-            self.logger.debug("%s: Asserting condition '%s'." % (sds_file.filename,
-                                                                 condition.func.__name__))
+            self.logger.debug("%s: Asserting condition '%s'.", sds_file.filename,
+                              condition.name)
             if not condition(sds_file):
-
-                # If a __wrapped__ attribute exists the function was inverted
-                if "__wrapped__" in dir(condition.func):
-                    raise AssertionError("!%s" % condition.func.__name__)
-                else:
-                    raise AssertionError(condition.func.__name__)
+                raise AssertionError(condition.name)
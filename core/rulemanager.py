@@ -1,14 +1,54 @@
+import copy
 import logging
+import os
 import signal
-import json
+import threading
 import jsonschema
 
-from functools import partial, wraps
-from core.rule import Rule
+# Use the faster orjson decoder when it is installed
+try:
+    import orjson as json
+except ImportError:
+    import json
+
+from concurrent.futures import (FIRST_COMPLETED, ThreadPoolExecutor, wait,
+                                TimeoutError as FutureTimeoutError)
+from core.rule import BoundFunction, Rule
 from core.exceptions import ExitPipelineException
 from configuration import config
 from schema import JSON_RULE_SCHEMA
 
+# Parsed JSON files by path, with the modification time they were read at
+_json_cache = {}
+
+
+def _load_json(path):
+    """Return the parsed contents of a JSON file, reusing the previous result when
+    the file was not modified since it was last read.
+
+    Callers get their own copy, so they may modify it (e.g. `load_rules` adds the
+    rule names to the rule map).
+    """
+
+    mtime = os.stat(path).st_mtime_ns
+    cached = _json_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, "rb") as json_file:
+            cached = (mtime, json.loads(json_file.read()))
+        _json_cache[path] = cached
+
+    return copy.deepcopy(cached[1])
+
+
+class _RuleStillRunning(TimeoutError):
+    """Raised when a rule running in a thread pool timed out, as it cannot be
+    interrupted and keeps running."""
+
+
+class _NoFreeWorker(TimeoutError):
+    """Raised when no thread of the pool became free to start a rule within its
+    timeout, e.g. because all of them are held by timed out rules."""
+
 
 class RuleManager():
 
@@ -26,6 +66,23 @@ class RuleManager():
         self.rules = None
         self.conditions = None
         self.rule_sequence = None
+        self.compiled_sequence = None
+
+        # Rules are executed in the calling thread with SIGALRM timeouts by default.
+        # A number of workers runs them in a thread pool instead, where timed out
+        # rules cannot be interrupted and keep running in the background.
+        workers = config.get("RULE_WORKERS", 0)
+
+        # Signal handlers can only be installed from the main thread
+        if not workers and threading.current_thread() is not threading.main_thread():
+            raise ValueError("SIGALRM timeouts require the main thread, set RULE_WORKERS "
+                             "to run the rules in a thread pool instead.")
+
+        if workers:
+            self._executor = ThreadPoolExecutor(max_workers=workers)
+        else:
+            self._executor = None
+            signal.signal(signal.SIGALRM, self.__signal_handler)
 
     def __signal_handler(self, signum, frame):
         """Raise an exception when a signal SIGALRM was received."""
@@ -55,16 +112,14 @@ class RuleManager():
 
         # Load the rule sequence JSON file
         try:
-            with open(rule_sequence_file) as order_file:
-                rule_seq = json.load(order_file)
+            rule_seq = _load_json(rule_sequence_file)
         except IOError:
             raise IOError("The rule sequence file %s could not be found." % rule_sequence_file)
 
         # Load the rule configuration JSON file
         rule_map_file = rule_seq["rule_map"]
         try:
-            with open(rule_map_file) as rule_file:
-                rule_desc = json.load(rule_file)
+            rule_desc = _load_json(rule_map_file)
         except IOError:
             raise IOError("The rulemap %s could not be found." % rule_map_file)
 
@@ -83,11 +138,14 @@ class RuleManager():
             raise ValueError("The rule %s could not be found in the configured rule map %s." %
                              (exception.args[0], rule_map_file))
 
-        # Check if the rules are valid
-        self.__check_rule_sequence(self.rule_sequence)
+        # Bind the rules once, they are reused for every item in the sequence
+        self.compiled_sequence = self.__compile_rule_sequence(self.rule_sequence)
 
-    def __check_rule_sequence(self, sequence):
-        """Check validity of the configured rule sequence."""
+    def __compile_rule_sequence(self, sequence):
+        """Resolve and bind the rules of the configured sequence, checking their
+        validity."""
+
+        compiled_sequence = []
 
         # Check each rule that it exists & is a callable Python function
         for item in sequence:
@@ -101,26 +159,24 @@ class RuleManager():
                     item)
 
             # The rule must be callable (function) too
-            if not callable(rule.call):
+            if not callable(rule.call.func):
                 raise ValueError(
                     "Python rule for configured sequence item %s is not callable." %
                     item)
 
+            compiled_sequence.append((rule, timeout))
+
+        return compiled_sequence
+
     def bind_options(self, definitions, item):
         """Bind options to a function call."""
 
-        def invert(f):
-            @wraps(f)
-            def g(*args, **kwargs):
-                return not f(*args, **kwargs)
-            return g
-
         # Invert the boolean result from the condition
         if (definitions == self.conditions) and item["function_name"].startswith("!"):
-            return partial(invert(getattr(definitions, item["function_name"][1:])),
-                           item["options"])
+            return BoundFunction(getattr(definitions, item["function_name"][1:]),
+                                 item["options"], negate=True)
         else:
-            return partial(getattr(definitions, item["function_name"]), item["options"])
+            return BoundFunction(getattr(definitions, item["function_name"]), item["options"])
 
     def get_rule(self, rule):
         """Return specific rule from name and its execution timeout."""
@@ -129,7 +185,7 @@ class RuleManager():
         # There may be multiple conditions defined per rule
         rule_obj = Rule(
             self.bind_options(self.rules, rule),
-            map(lambda x: self.bind_options(self.conditions, x), rule["conditions"]),
+            [self.bind_options(self.conditions, x) for x in rule["conditions"]],
             name=rule["rule_name"]
         )
 
@@ -138,6 +194,169 @@ class RuleManager():
 
         return (rule_obj, timeout)
 
+    def _apply_rule(self, apply, target, timeout, executor):
+        """Call `apply` on the target (an item, or a list of items for batch rules),
+        raising `TimeoutError` if it takes longer than `timeout` seconds.
+
+        When running in a thread pool, the timeout counts from the moment the rule
+        starts. A timed out rule cannot be interrupted and keeps running in its worker
+        thread until it returns, `_RuleStillRunning` is raised in that case. Waiting for
+        a free worker is bounded by the same timeout, `_NoFreeWorker` is raised when
+        none became free.
+        """
+
+        if executor is None:
+            signal.alarm(timeout)
+            try:
+                apply(target)
+            finally:
+                signal.alarm(0)
+            return
+
+        started = threading.Event()
+
+        def run():
+            started.set()
+            apply(target)
+
+        future = executor.submit(run)
+        if not started.wait(timeout) and future.cancel():
+            raise _NoFreeWorker("No free thread to run the rule.")
+        try:
+            future.result(timeout=timeout)
+        except FutureTimeoutError:
+            raise _RuleStillRunning("Rule execution has timed out.")
+
+    def _run_rule(self, apply, rule, target, item_names, timeout, executor):
+        """Apply a rule and log its outcome for each of the given item names.
+
+        Returns `False` when the pipeline has to be exited for these items.
+        """
+
+        # Rule options are bound to the call
+        try:
+            for item_name in item_names:
+                self.logger.debug("%s - %s - Executing", item_name, rule.name)
+            self._apply_rule(apply, target, timeout, executor)
+            for item_name in item_names:
+                self.logger.info("%s - %s - Success", item_name, rule.name)
+
+        # A rule called for the pipeline to be exited for this file
+        except ExitPipelineException as e:
+            for item_name in item_names:
+                if e.is_error:
+                    # The exception came from an error
+                    self.logger.error("%s - %s - Failure: %s", item_name, rule.name,
+                                      e.message)
+                else:
+                    # A rule executed successfully and called for an exit
+                    self.logger.info("%s - %s - Success", item_name, rule.name)
+
+                self.logger.info("%s - Exit", item_name)
+            return False
+
+        # All the threads of the pool are held by timed out rules
+        except _NoFreeWorker:
+            for item_name in item_names:
+                self.logger.warning("%s - %s - No free thread", item_name, rule.name)
+                self.logger.info("%s - Exit", item_name)
+            return False
+
+        # The rule was timed out
+        except TimeoutError as e:
+            for item_name in item_names:
+                self.logger.warning("%s - %s - Timeout", item_name, rule.name)
+
+            # The next rules must not run on these items while this one is still running
+            if isinstance(e, _RuleStillRunning):
+                for item_name in item_names:
+                    self.logger.info("%s - Exit", item_name)
+                return False
+
+        # Condition assertion errors
+        except AssertionError as e:
+            for item_name in item_names:
+                self.logger.info("%s - %s - Did not pass condition '%s'.",
+                                 item_name, rule.name, e)
+
+        # Other exceptions
+        except Exception as e:
+            for item_name in item_names:
+                self.logger.error("%s - %s - Failure: %s", item_name, rule.name, e,
+                                  exc_info=False)
+
+        return True
+
+    def _process_item(self, item, i, total, executor):
+        """Run the sequence of rules on a single item."""
+
+        # The string representation may be costly (e.g. SDSFile stats the file)
+        item_name = str(item)
+
+        self.logger.info("%s - Item %d of %d", item_name, i+1, total)
+
+        # Get the sequence of rules to be applied
+        for rule, timeout in self.compiled_sequence:
+            if not self._run_rule(rule.apply, rule, item, (item_name,), timeout, executor):
+                break
+
+    def _process_batch(self, batch, offset, total, executor):
+        """Run the sequence of rules on a batch of items.
+
+        Regular rules are applied to each item in turn, batch rules are called once
+        with all the items that passed their conditions. The conditions of a batch rule
+        are asserted for each item under the rule timeout, and the batch call gets the
+        rule timeout multiplied by its number of items.
+        """
+
+        item_names = [str(item) for item in batch]
+        for i, item_name in enumerate(item_names, offset + 1):
+            self.logger.info("%s - Item %d of %d", item_name, i, total)
+
+        # Indices of the items that did not exit the pipeline
+        active = list(range(len(batch)))
+
+        for rule, timeout in self.compiled_sequence:
+
+            if not rule.batch:
+                active = [i for i in active
+                          if self._run_rule(rule.apply, rule, batch[i], (item_names[i],),
+                                            timeout, executor)]
+                continue
+
+            # Conditions are asserted per item (they may query MongoDB or FDSNWS)
+            passed = []
+            exited = set()
+            for i in active:
+                try:
+                    self._apply_rule(rule.assert_policies, batch[i], timeout, executor)
+                    passed.append(i)
+                except AssertionError as e:
+                    self.logger.info("%s - %s - Did not pass condition '%s'.",
+                                     item_names[i], rule.name, e)
+                except _NoFreeWorker:
+                    self.logger.warning("%s - %s - No free thread", item_names[i], rule.name)
+                    self.logger.info("%s - Exit", item_names[i])
+                    exited.add(i)
+                except TimeoutError as e:
+                    self.logger.warning("%s - %s - Timeout", item_names[i], rule.name)
+                    if isinstance(e, _RuleStillRunning):
+                        self.logger.info("%s - Exit", item_names[i])
+                        exited.add(i)
+                except Exception as e:
+                    self.logger.error("%s - %s - Failure: %s", item_names[i], rule.name, e,
+                                      exc_info=False)
+
+            # The batch gets the time of all its items
+            if passed and not self._run_rule(rule.apply_batch, rule,
+                                             [batch[i] for i in passed],
+                                             [item_names[i] for i in passed],
+                                             timeout * len(passed), executor):
+                exited.update(passed)
+
+            if exited:
+                active = [i for i in active if i not in exited]
+
     def sequence(self, items):
         """
         Def RuleManager.sequence
@@ -153,55 +372,76 @@ class RuleManager():
 
         # Items can be SDSFiles or metadata (XML) files
         for i, item in enumerate(items):
+            self._process_item(item, i, total, self._executor)
 
-            self.logger.info("%s - Item %d of %d" % (str(item), i+1, total))
+    def sequence_batched(self, items, batch_size):
+        """Runs the sequence of rules on the given file list, in batches of items.
 
-            # Get the sequence of rules to be applied
-            for rule, timeout in map(self.get_rule, self.rule_sequence):
+        Batch rules are called once per batch with the list of items that passed their
+        conditions, so they can group their database or network requests. Their timeout
+        is multiplied by the number of items they are called with, and a failure or
+        timeout applies to all of these items. Other rules are applied to each item of
+        the batch in turn.
 
-                # Set a signal
-                signal.signal(signal.SIGALRM, self.__signal_handler)
-                signal.alarm(timeout)
+        Parameters
+        ----------
+        items
+            A list of objects that can be processed by the loaded rules.
+        batch_size : `int`
+            Maximum number of items in a batch.
+        """
 
-                # Rule options are bound to the call
-                try:
-                    self.logger.debug("%s - %s - Executing" % (str(item), rule.name))
-                    rule.apply(item)
-                    self.logger.info("%s - %s - Success"
-                                     % (str(item), rule.name))
-
-                # A rule called for the pipeline to be exited for this file
-                except ExitPipelineException as e:
-                    if e.is_error:
-                        # The exception came from an error
-                        self.logger.error("%s - %s - Failure: %s"
-                                          % (str(item), rule.name, e.message))
-                    else:
-                        # A rule executed successfully and called for an exit
-                        self.logger.info("%s - %s - Success"
-                                         % (str(item), rule.name))
-
-                    self.logger.info("%s - Exit" % (str(item)))
-
-                    # The "finally" block WILL be executed even after breaking
-                    break
-
-                # The rule was timed out
-                except TimeoutError:
-                    self.logger.warning("%s - %s - Timeout"
-                                        % (str(item), rule.name))
-
-                # Condition assertion errors
-                except AssertionError as e:
-                    self.logger.info(
-                        "%s - %s - Did not pass condition '%s'."
-                        % (str(item), rule.name, e))
+        if batch_size < 1:
+            raise ValueError("The batch size must be a positive number.")
 
-                # Other exceptions
-                except Exception as e:
-                    self.logger.error("%s - %s - Failure: %s"
-                                      % (str(item), rule.name, e), exc_info=False)
+        total = len(items)
+
+        for offset in range(0, total, batch_size):
+            self._process_batch(items[offset:offset + batch_size], offset, total,
+                                self._executor)
+
+    def sequence_parallel(self, items, workers=None):
+        """Runs the sequence of rules on the given file list, processing several items
+        concurrently.
+
+        Items are processed in a pool of threads, which suits rules waiting on I/O
+        (file reads, iRODS, S3, MongoDB, FDSNWS). The rules of each item still run in
+        order. At most twice the number of workers items are queued at any time, and
+        an exception escaping the processing of an item is raised here. Rules that
+        timed out are not waited for, they keep running in the background.
+
+        Parameters
+        ----------
+        items
+            An iterable collection of objects that can be processed by the loaded rules.
+        workers : `int`, optional
+            Number of items processed at the same time (default `os.cpu_count()`).
+        """
+
+        workers = workers or os.cpu_count()
+        total = len(items)
+
+        # Every item thread waits on its own rule execution, so the rule pool needs
+        # at least one thread per item worker, plus some for timed out rules
+        rule_executor = ThreadPoolExecutor(max_workers=2 * workers)
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as item_executor:
+
+                pending = set()
+                for i, item in enumerate(items):
+
+                    # Wait for a slot when the queue is full
+                    if len(pending) >= 2 * workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+                        # Raise the exceptions that escaped the processing of an item
+                        for future in done:
+                            future.result()
+
+                    pending.add(item_executor.submit(self._process_item, item, i, total,
+                                                     rule_executor))
 
-                # Disable the alarm
-                finally:
-                    signal.alarm(0)
+                for future in wait(pending).done:
+                    future.result()
+        finally:
+            rule_executor.shutdown(wait=False)
@@ -49,5 +49,7 @@ config = {
         "FILENAME": None # use None for stdout
     },
     "DEFAULT_RULE_TIMEOUT" : 10,
+    "CHECKSUM_ALGO": "adler32", # or any hashlib algorithm, e.g. "sha256", "blake2b"
+    "RULE_WORKERS": 0, # > 0 runs rules in a thread pool, timed out rules keep running
     "DELETION_DB": "./deletion.db"
 }
@@ -247,8 +247,9 @@ class IRODSManager():
             self.logger.debug("File not registered, cancelling deletion.")
             return
 
-        # Unlink the data object
+        # Unlink the data object, its PID goes with it
         data_object.unlink(force=force)
+        sds_file.pid = None
 
     def remote_put(self, sds_file, root_collection,
                    resc_name="demoResc",
@@ -456,6 +457,9 @@ class IRODSManager():
     def get_pid(self, sds_file, root_collection=None):
         """Get the PID assigned to the file, or None if the file has no PID.
 
+        The PID found in the local archive is cached in `sds_file.pid`, so rules of
+        the same sequence do not query iRODS again.
+
         Parameters
         ----------
         sds_file : `SDSFile`
@@ -465,6 +469,16 @@ class IRODSManager():
             e.g., a replication site.
         """
 
+        if root_collection is None:
+            if sds_file.pid is None:
+                sds_file.pid = self._get_pid(sds_file)
+            return sds_file.pid
+
+        return self._get_pid(sds_file, root_collection)
+
+    def _get_pid(self, sds_file, root_collection=None):
+        """Query iRODS for the PID assigned to the file."""
+
         # Attempt to get the data object
         data_object = self.get_data_object(sds_file, root_collection=root_collection)
         if data_object is None:
@@ -17,10 +17,16 @@ mongo_pool.set_wfcatalog_daily_document("collection_name", document)
 """
 
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from configuration import config
 
 # MongoDB driver for Python
-from pymongo import MongoClient
+from pymongo import MongoClient, DeleteMany, InsertOne, UpdateMany
+
+
+def _files_query(sds_files):
+    """Returns a query matching the documents of any of the given files."""
+    return {"fileId": {"$in": [sds_file.filename for sds_file in sds_files]}}
 
 
 class MongoSession():
@@ -84,18 +90,20 @@ class MongoSession():
         if self._authenticate:
             self.database.authenticate(self._user, self._pass)
 
-    def find_one(self, query):
-        """Finds a single document in the collection."""
-        doc = self.collection.find_one(query)
+    def find_one(self, query, projection=None):
+        """Finds a single document in the collection, optionally only with the fields
+        in `projection`."""
+        doc = self.collection.find_one(query, projection)
         if doc is not None:
             self._logger.debug("Found 1 document in '%s' collection",
                                self._collection_name)
         return doc
 
-    def find_many(self, query):
-        """Finds documents in the collection."""
+    def find_many(self, query, projection=None):
+        """Finds documents in the collection, optionally only with the fields
+        in `projection`."""
         count = self.collection.count_documents(query)
-        cur = self.collection.find(query)
+        cur = self.collection.find(query, projection)
         self._logger.debug("Found %d document(s) in '%s' collection",
                            count, self._collection_name)
         return cur
@@ -132,11 +140,24 @@ class MongoSession():
 
     def save_many(self, documents):
         """Save a list of documents."""
-        res = self.collection.insert_many(documents)
+        res = self.collection.insert_many(documents, ordered=False)
         if res.acknowledged:
             self._logger.debug("Inserted %d document(s) into '%s' collection",
                                len(res.inserted_ids), self._collection_name)
 
+    def replace_many(self, query, documents):
+        """Replaces the documents matching `query` with a list of documents,
+        in a single bulk write."""
+
+        # Must be ordered, the deletion has to run before the insertions
+        requests = [DeleteMany(query)]
+        requests.extend(InsertOne(document) for document in documents)
+        res = self.collection.bulk_write(requests, ordered=True)
+        if res.acknowledged:
+            self._logger.debug("Deleted %d and inserted %d document(s) in '%s' collection",
+                               res.deleted_count, res.inserted_count,
+                               self._collection_name)
+
 
 class MongoManager():
     """Stores all the MongoDB sessions from the configuration. Reads all
@@ -157,6 +178,17 @@ class MongoManager():
         for session_name in self.sessions:
             self.sessions[session_name].connect()
 
+        # Threads to send independent writes at the same time (pymongo is thread safe)
+        self._executor = ThreadPoolExecutor(max_workers=4)
+
+    def _concurrently(self, *calls):
+        """Runs the given (function, arguments...) calls at the same time, waiting
+        for all of them and raising the first exception."""
+
+        futures = [self._executor.submit(*call) for call in calls]
+        for future in futures:
+            future.result()
+
     def save_dc_document(self, document):
         """Saves a Dublin Core document."""
         self.sessions["Dublin Core"].save(document)
@@ -180,18 +212,82 @@ class MongoManager():
         """Saves a WFCatalog-daily document."""
         self.sessions["WFCatalog-daily"].save(document)
 
+    def replace_wfcatalog_daily_documents_batch(self, sds_files, documents):
+        """Replace the WFCatalog-daily documents corresponding to a list of files."""
+        self.sessions["WFCatalog-daily"].replace_many(_files_query(sds_files), documents)
+
+    def save_wfcatalog_documents(self, sds_file, doc_daily, docs_segments):
+        """Saves the WFCatalog-daily document of a file and replaces its
+        WFCatalog-segments documents (unless `docs_segments` is `None`),
+        writing to both collections at the same time."""
+
+        calls = [(self.set_wfcatalog_daily_document, doc_daily)]
+        if docs_segments is not None:
+            calls.append((self.replace_wfcatalog_segments_documents, sds_file,
+                          docs_segments))
+        self._concurrently(*calls)
+
+    def save_wfcatalog_documents_batch(self, sds_files, docs_daily,
+                                       segmented_files, docs_segments):
+        """Replaces the WFCatalog-daily documents of a list of files and the
+        WFCatalog-segments documents of the files in `segmented_files`,
+        writing to both collections at the same time."""
+
+        calls = [(self.replace_wfcatalog_daily_documents_batch, sds_files, docs_daily)]
+        if segmented_files:
+            calls.append((self.replace_wfcatalog_segments_documents_batch,
+                          segmented_files, docs_segments))
+        self._concurrently(*calls)
+
     def get_wfcatalog_daily_document(self, sds_file):
         """Returns a WFCatalog-daily document corresponding to a file."""
         return self.sessions["WFCatalog-daily"].find_one({"fileId": sds_file.filename})
 
+    def get_wfcatalog_daily_checksums(self, sds_file):
+        """Returns the checksums stored in the WFCatalog-daily document corresponding
+        to a file, without the metrics."""
+        return self.sessions["WFCatalog-daily"].find_one(
+            {"fileId": sds_file.filename},
+            {"_id": False, "checksum": True, "checksum_prev": True})
+
     def delete_wfcatalog_daily_document(self, sds_file):
         """Delete one WFCatalog-daily document corresponding to a file."""
         return self.sessions["WFCatalog-daily"].delete_one({"fileId": sds_file.filename})
 
+    def delete_wfcatalog_daily_documents_batch(self, sds_files):
+        """Delete the WFCatalog-daily documents corresponding to a list of files."""
+        self.sessions["WFCatalog-daily"].delete_many(_files_query(sds_files))
+
+    def set_wfcatalog_daily_pid(self, sds_file, pid):
+        """Sets the PID of the WFCatalog-daily documents corresponding to a file."""
+        self.sessions["WFCatalog-daily"].collection.update_many(
+            {"fileId": sds_file.filename},
+            {"$set": {"dc_identifier": pid}})
+
+    def set_wfcatalog_daily_pids(self, pids):
+        """Sets the PIDs of the WFCatalog-daily documents corresponding to a list of
+        (file, PID) pairs, in a single bulk write."""
+
+        requests = [UpdateMany({"fileId": sds_file.filename},
+                               {"$set": {"dc_identifier": pid}})
+                    for sds_file, pid in pids]
+        if requests:
+            self.sessions["WFCatalog-daily"].collection.bulk_write(requests, ordered=False)
+
     def save_wfcatalog_segments_documents(self, documents):
         """Save a list of WFCatalog-segments documents."""
         self.sessions["WFCatalog-segments"].save_many(documents)
 
+    def replace_wfcatalog_segments_documents(self, sds_file, documents):
+        """Replace the WFCatalog-segments documents corresponding to a file."""
+        self.sessions["WFCatalog-segments"].replace_many({"fileId": sds_file.filename},
+                                                         documents)
+
+    def replace_wfcatalog_segments_documents_batch(self, sds_files, documents):
+        """Replace the WFCatalog-segments documents corresponding to a list of files."""
+        self.sessions["WFCatalog-segments"].replace_many(_files_query(sds_files),
+                                                         documents)
+
     def get_wfcatalog_segments_documents(self, sds_file):
         """Return the WFCatalog-segments documents that correspond to a file."""
         return list(self.sessions["WFCatalog-segments"].find_many(
@@ -201,6 +297,10 @@ class MongoManager():
         """Delete the WFCatalog-segments documents corresponding to a file."""
         self.sessions["WFCatalog-segments"].delete_many({"fileId": sds_file.filename})
 
+    def delete_wfcatalog_segments_documents_batch(self, sds_files):
+        """Delete the WFCatalog-segments documents corresponding to a list of files."""
+        self.sessions["WFCatalog-segments"].delete_many(_files_query(sds_files))
+
     def save_ppsd_document(self, document):
         """Saves a PPSD document."""
         self.sessions["PPSD"].save(document, overwrite=False)
@@ -209,10 +309,25 @@ class MongoManager():
         """Save a list of PPSD documents."""
         self.sessions["PPSD"].save_many(documents)
 
+    def replace_ppsd_documents(self, sds_file, documents):
+        """Replace the PPSD documents corresponding to a file."""
+        self.sessions["PPSD"].replace_many({"fileId": sds_file.filename}, documents)
+
+    def replace_ppsd_documents_batch(self, sds_files, documents):
+        """Replace the PPSD documents corresponding to a list of files."""
+        self.sessions["PPSD"].replace_many(_files_query(sds_files), documents)
+
     def get_ppsd_documents(self, sds_file):
         """Return the PPSD documents that correspond to a file."""
         return list(self.sessions["PPSD"].find_many({"fileId": sds_file.filename}))
 
+    def get_ppsd_checksums(self, sds_file):
+        """Return the checksums stored in the PPSD documents that correspond to a file,
+        without the spectra."""
+        return list(self.sessions["PPSD"].find_many(
+            {"fileId": sds_file.filename},
+            {"_id": False, "checksum": True, "checksum_prev": True, "checksum_next": True}))
+
     def delete_ppsd_documents(self, sds_file):
         """Delete the PPSD documents corresponding to a file."""
         self.sessions["PPSD"].delete_many({"fileId": sds_file.filename})
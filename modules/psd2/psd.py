@@ -92,22 +92,22 @@ class PSDCollector():
         # Create an empty stream to fill
         ObspyStream = Stream()
 
+        # Read from 0h of this day, most likely in the previous day file,
+        # until half an hour in the next day [psd segment end]
+        starttime = UTCDateTime(SDSFile.start)
+        endtime = UTCDateTime(SDSFile.end) + 0.5 * SEGMENT_LENGTH
+
         # Read neighbouring files
         for neighbour in SDSFile.neighbours:
-
-            # Read from 0h of this day, most likely in the previous day file,
-            # until half an hour in the next day [psd segment end]
-            st = read(
+            ObspyStream += read(
                 neighbour.filepath,
-                starttime=UTCDateTime(SDSFile.start),
-                endtime=UTCDateTime(SDSFile.end) + 0.5 * SEGMENT_LENGTH,
+                starttime=starttime,
+                endtime=endtime,
                 nearest_sample=False
             )
 
-            # Concatenate all the traces
-            for tr in st:
-                if tr.stats.npts != 0:
-                    ObspyStream.extend([tr])
+        # Concatenate all the traces with data
+        ObspyStream.traces = [tr for tr in ObspyStream if tr.stats.npts != 0]
 
         # No data found
         if not ObspyStream:
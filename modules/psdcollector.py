@@ -1,9 +1,9 @@
 import base64
 import logging
+import numpy as np
 
 from bson.binary import Binary
 from datetime import timedelta
-from struct import pack
 from hashlib import sha256
 
 # ObsPy imports
@@ -115,19 +115,21 @@ class PSDCollector():
         # Create an empty stream to fill
         ObspyStream = Stream()
 
+        # The time window is the same for every file
+        starttime = UTCDateTime(SDSFile.start)
+        endtime = UTCDateTime(SDSFile.next.end)
+
         # Read neighbouring files is necessary to get the boundary overlapping data
         # Of the next day.. the previous day was already "done" with the previous file
         for neighbour in SDSFile.neighbours:
-            st = read(neighbour.filepath,
-                      starttime=UTCDateTime(SDSFile.start),
-                      endtime=UTCDateTime(SDSFile.next.end),
-                      nearest_sample=False,
-                      format="MSEED")
+            ObspyStream += read(neighbour.filepath,
+                                starttime=starttime,
+                                endtime=endtime,
+                                nearest_sample=False,
+                                format="MSEED")
 
-            # Concatenate all traces
-            for tr in st:
-                if tr.stats.npts != 0:
-                    ObspyStream.extend([tr])
+        # Concatenate all traces with data
+        ObspyStream.traces = [tr for tr in ObspyStream if tr.stats.npts != 0]
 
         # No data found
         if not ObspyStream:
@@ -180,7 +182,7 @@ class PSDCollector():
         Converts values to single byte array we pack the values to a string of single bytes
         """
 
-        return Binary(b"".join([pack("B", b) for b in array]))
+        return Binary(np.asarray(array, dtype=np.uint8).tobytes())
 
     def __getFrequencyOffset(self, segment, mask, isPressureChannel):
 
@@ -191,36 +193,28 @@ class PSDCollector():
         and are above the nyquist frequency. We check the first occurence of True: that means the frequency offset
         """
 
-        # Determine the first occurrence of True
-        # from the Boolean mask, this will be the offset
-        counter = 0
-        for boolean in mask:
-            if not boolean:
-                counter += 1
-            else:
-                return [counter] + [self.__reduce(x, isPressureChannel) for x in segment]
+        mask = np.asarray(mask, dtype=bool)
 
-    def __reduce(self, x, isPressureChannel):
+        # No valid frequencies at all
+        if not mask.any():
+            return None
 
-        """
-        def PSDCollector::__reduce
-        Keeps values within single byte bounds (ObsPy PSD values are negative)
-        """
+        # Determine the first occurrence of True
+        # from the Boolean mask, this will be the offset
+        offset = int(np.argmax(mask))
 
         # Infrasound is shifted downward by 100dB
         # They use a normalized pressure of 20 micropascals which shifts our PSD out of range
+        values = np.asarray(segment).astype(np.int32)
         if isPressureChannel:
-            x = int(x) - 100
-        else:
-            x = int(x)
-
-        # Value is bound within one byte
-        if x < -255:
-            return 0
-        if x > 0:
-            return 255
-        else:
-            return x + 255
+            values -= 100
+
+        # Keep values within single byte bounds (ObsPy PSD values are negative)
+        result = np.empty(values.size + 1, dtype=np.uint8)
+        result[0] = offset
+        result[1:] = np.clip(values, -255, 0) + 255
+
+        return result
 
     def process(self, SDSFile):
 
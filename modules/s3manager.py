@@ -1,4 +1,7 @@
+import threading
+
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 
 from configuration import config
@@ -7,12 +10,24 @@ from configuration import config
 BUCKET_NAME = config["S3"]["BUCKET_NAME"]
 PROFILE = config["S3"]["PROFILE"]
 
+# Files above 8 MiB are uploaded in 8 MiB parts, up to 10 parts at a time
+TRANSFER_CONFIG = TransferConfig(multipart_threshold=8 * 1024 * 1024,
+                                 multipart_chunksize=8 * 1024 * 1024,
+                                 max_concurrency=10,
+                                 use_threads=True)
+
+# boto3 sessions and resources are not thread safe, keep one per thread
+_local = threading.local()
+
 
 def _get_bucket():
     """Returns the Bucket resource object for the SDS archive."""
-    session = boto3.session.Session(profile_name=PROFILE)
-    s3_resource = session.resource("s3")
-    return s3_resource.Bucket(name=BUCKET_NAME)
+    bucket = getattr(_local, "bucket", None)
+    if bucket is None:
+        session = boto3.session.Session(profile_name=PROFILE)
+        s3_resource = session.resource("s3")
+        bucket = _local.bucket = s3_resource.Bucket(name=BUCKET_NAME)
+    return bucket
 
 
 def exists(sds_file):
@@ -34,7 +49,8 @@ def put(sds_file):
     bucket = _get_bucket()
     new_object = bucket.Object(sds_file.s3_key)
     new_object.upload_file(sds_file.filepath,
-                           ExtraArgs={"Metadata": {"checksum": str(sds_file.checksum)}})
+                           ExtraArgs={"Metadata": {"checksum": str(sds_file.checksum)}},
+                           Config=TRANSFER_CONFIG)
 
 
 def delete(sds_file):
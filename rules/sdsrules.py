@@ -4,15 +4,20 @@ Module that houses all the rule handlers for SDS daily files.
 Every rule should be implemented as a module function with exactly two arguments:
 1) a `dict` that holds the options for the rule, and
 2) the item that is subject to the rule, in this case, a `SDSFile` object.
+
+Rules decorated with `batch_rule` receive a `list` of `SDSFile` objects instead.
 """
 
 import logging
 import os
 import shutil
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from botocore.exceptions import CredentialRetrievalError
 from boto3.exceptions import S3UploadFailedError
 from core.exceptions import ExitPipelineException
+from core.rule import batch_rule
 
 from modules.wfcatalog import get_wf_metadata
 from modules.dublincore import extract_dc_metadata
@@ -24,6 +29,9 @@ from modules.psd2.psd import PSDCollector
 
 logger = logging.getLogger("RuleManager")
 
+# Only holds the frequencies to evaluate, so it can be shared between rules and threads
+_psd_collector = PSDCollector(connect_sql=False)
+
 
 def ppsd_metadata_rule(options, sds_file):
     """Handler for PPSD calculation.
@@ -36,15 +44,38 @@ def ppsd_metadata_rule(options, sds_file):
         The file to be processed.
     """
 
-    logger.debug("Computing PPSD metadata for %s." % sds_file.filename)
+    logger.debug("Computing PPSD metadata for %s.", sds_file.filename)
 
     # Process PPSD
-    documents = PSDCollector(connect_sql=False).process(sds_file, cache_response=False)
+    documents = _psd_collector.process(sds_file, cache_response=False)
 
     # Save to the database
-    mongo_pool.delete_ppsd_documents(sds_file)
-    mongo_pool.save_ppsd_documents(documents)
-    logger.debug("Saved PPSD metadata for %s." % sds_file.filename)
+    mongo_pool.replace_ppsd_documents(sds_file, documents)
+    logger.debug("Saved PPSD metadata for %s.", sds_file.filename)
+
+
+@batch_rule
+def ppsd_metadata_rule_batch(options, sds_files):
+    """Handler for PPSD calculation of a batch of files, saving all the documents
+    in a single database request.
+
+    Parameters
+    ----------
+    options : `dict`
+        The rule's options.
+    sds_files : `list` of `SDSFile`
+        The files to be processed.
+    """
+
+    # Process PPSD
+    documents = []
+    for sds_file in sds_files:
+        logger.debug("Computing PPSD metadata for %s.", sds_file.filename)
+        documents.extend(_psd_collector.process(sds_file, cache_response=False))
+
+    # Save to the database
+    mongo_pool.replace_ppsd_documents_batch(sds_files, documents)
+    logger.debug("Saved PPSD metadata for %d files.", len(sds_files))
 
 
 def delete_ppsd_metadata_rule(options, sds_file):
@@ -58,9 +89,9 @@ def delete_ppsd_metadata_rule(options, sds_file):
         The file to be processed.
     """
 
-    logger.debug("Deleting PPSD metadata for %s." % sds_file.filename)
+    logger.debug("Deleting PPSD metadata for %s.", sds_file.filename)
     mongo_pool.delete_ppsd_documents(sds_file)
-    logger.debug("Deleted PPSD metadata for %s." % sds_file.filename)
+    logger.debug("Deleted PPSD metadata for %s.", sds_file.filename)
 
 
 def prune_rule(options, sds_file):
@@ -82,7 +113,7 @@ def prune_rule(options, sds_file):
         The file to be processed.
     """
 
-    logger.debug("Pruning file %s." % sds_file.filename)
+    logger.debug("Pruning file %s.", sds_file.filename)
 
     # Prune the file to a .Q quality file in the temporary archive
     sds_file.prune(cut_boundaries=options["cut_boundaries"],
@@ -90,7 +121,7 @@ def prune_rule(options, sds_file):
                    record_length=options["repack_record_size"],
                    remove_overlap=options["remove_overlap"])
 
-    logger.debug("Pruned file %s." % sds_file.filename)
+    logger.debug("Pruned file %s.", sds_file.filename)
 
 
 def ingestion_irods_rule(options, sds_file):
@@ -107,7 +138,7 @@ def ingestion_irods_rule(options, sds_file):
         The file to be processed.
     """
 
-    logger.debug("Ingesting file %s." % sds_file.filename)
+    logger.debug("Ingesting file %s.", sds_file.filename)
 
     # Attempt to ingest to iRODS
     irods_session.create_data_object(sds_file,
@@ -115,9 +146,47 @@ def ingestion_irods_rule(options, sds_file):
                                      purge_cache=True,
                                      register_checksum=True)
 
-    # Check if checksum is saved
-    logger.debug("Ingested file %s with checksum '%s'" % (
-        sds_file.filename, irods_session.get_data_object(sds_file).checksum))
+    # Check if checksum is saved, costs a request to iRODS
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Ingested file %s with checksum '%s'", sds_file.filename,
+                     irods_session.get_data_object(sds_file).checksum)
+
+
+@batch_rule
+def ingestion_irods_rule_batch(options, sds_files):
+    """Handler for the ingestion rule on a batch of files, ingesting up to 7 files
+    at the same time.
+
+    Parameters
+    ----------
+    options : `dict`
+        The rule's options.
+        - ``resc_name``: Name of the iRODS resource to save the object (`str`)
+        - ``purge_cache``: Whether or not to purge the cache,
+                           in case the resource is compound (`bool`)
+    sds_files : `list` of `SDSFile`
+        The files to be processed.
+    """
+
+    logger.debug("Ingesting %d files.", len(sds_files))
+
+    def ingest(sds_file):
+        irods_session.create_data_object(sds_file,
+                                         resc_name="compResc",
+                                         purge_cache=True,
+                                         register_checksum=True)
+        return sds_file
+
+    # Attempt to ingest to iRODS, the first failure is raised
+    with ThreadPoolExecutor(max_workers=7) as executor:
+        futures = [executor.submit(ingest, sds_file) for sds_file in sds_files]
+        for future in as_completed(futures):
+            sds_file = future.result()
+
+            # Check if checksum is saved, costs a request to iRODS
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Ingested file %s with checksum '%s'", sds_file.filename,
+                             irods_session.get_data_object(sds_file).checksum)
 
 
 def ingestion_s3_rule(options, sds_file):
@@ -136,7 +205,7 @@ def ingestion_s3_rule(options, sds_file):
     `ExitPipelineException`
         Raised when upload fails and `exitOnFailure` is `True`.
     """
-    logger.debug("Ingesting file %s." % sds_file.filename)
+    logger.debug("Ingesting file %s.", sds_file.filename)
 
     try:
         # Upload file to S3
@@ -147,9 +216,48 @@ def ingestion_s3_rule(options, sds_file):
         else:
             raise
 
-    # Check if checksum is saved
-    logger.debug("Ingested file %s with checksum '%s'" % (
-        sds_file.filename, sds_file.checksum))
+    # The checksum was already computed for the object metadata, no request is made
+    logger.debug("Ingested file %s with checksum '%s'", sds_file.filename,
+                 sds_file.checksum)
+
+
+@batch_rule
+def ingestion_s3_rule_batch(options, sds_files):
+    """Handler for the ingestion rule on a batch of files, uploading up to 10 files
+    at the same time.
+
+    Parameters
+    ----------
+    options : `dict`
+        The rule's options.
+        - ``exit_on_failure``: Whether or not to exit the pipeline when an upload fails
+          (`bool`)
+    sds_files : `list` of `SDSFile`
+        The files to be processed.
+
+    Raises
+    ------
+    `ExitPipelineException`
+        Raised when an upload fails and `exit_on_failure` is `True`.
+    """
+    logger.debug("Ingesting %d files.", len(sds_files))
+
+    # Upload files to S3
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        futures = [executor.submit(s3manager.put, sds_file) for sds_file in sds_files]
+
+    # The batch fails with the first failed upload, after all of them are done
+    for sds_file, future in zip(sds_files, futures):
+        try:
+            future.result()
+        except (CredentialRetrievalError, S3UploadFailedError) as e:
+            if options["exit_on_failure"]:
+                raise ExitPipelineException(True, "%s: %s" % (sds_file.filename, e))
+            else:
+                raise
+
+        logger.debug("Ingested file %s with checksum '%s'", sds_file.filename,
+                     sds_file.checksum)
 
 
 def delete_s3_rule(options, sds_file):
@@ -164,15 +272,15 @@ def delete_s3_rule(options, sds_file):
         The description of the file to be deleted.
 
     """
-    if "dry_run" in options and options["dry_run"]:
-        logger.info("Would delete file %s from S3." % sds_file.filename)
+    if options.get("dry_run", False):
+        logger.info("Would delete file %s from S3.", sds_file.filename)
     else:
-        logger.debug("Deleting file %s from S3." % sds_file.filename)
+        logger.debug("Deleting file %s from S3.", sds_file.filename)
 
         # Attempt to delete from S3
         s3manager.delete(sds_file)
 
-        logger.debug("Deleted file %s from S3." % sds_file.filename)
+        logger.debug("Deleted file %s from S3.", sds_file.filename)
 
 
 def pid_rule(options, sds_file):
@@ -186,17 +294,23 @@ def pid_rule(options, sds_file):
         The file to be processed.
     """
 
-    logger.debug("Assigning PID to file %s." % sds_file.filename)
+    logger.debug("Assigning PID to file %s.", sds_file.filename)
 
     # Attempt to assign PID
     is_new, pid = irods_session.assign_pid(sds_file)
 
     if is_new is None:
-        logger.error("Error while assigning PID to file %s." % sds_file.filename)
-    elif is_new:
-        logger.info("Assigned PID %s to file %s." % (pid, sds_file.filename))
+        logger.error("Error while assigning PID to file %s.", sds_file.filename)
+        return
+
+    # Later rules reuse the PID instead of querying iRODS
+    sds_file.pid = pid
+
+    if is_new:
+        logger.info("Assigned PID %s to file %s.", pid, sds_file.filename)
     elif not is_new:
-        logger.info("File %s was already previously assigned PID %s." % (sds_file.filename, pid))
+        logger.info("File %s was already previously assigned PID %s.",
+                    sds_file.filename, pid)
 
 
 def add_pid_to_wfcatalog_rule(options, sds_file):
@@ -210,16 +324,47 @@ def add_pid_to_wfcatalog_rule(options, sds_file):
         The file to be processed.
     """
 
-    logger.debug("Updating WFCatalog with the PID of file %s." % sds_file.filename)
+    logger.debug("Updating WFCatalog with the PID of file %s.", sds_file.filename)
 
     pid = irods_session.get_pid(sds_file)
 
     if pid is not None:
-        mongo_pool.update_many({"fileId": sds_file.filename},
-                               {"$set": {"dc_identifier": pid}})
-        logger.info("Entry for file %s updated with PID %s." % (sds_file.filename, pid))
+        mongo_pool.set_wfcatalog_daily_pid(sds_file, pid)
+        logger.info("Entry for file %s updated with PID %s.", sds_file.filename, pid)
     else:
-        logger.error("File %s has no PID." % sds_file.filename)
+        logger.error("File %s has no PID.", sds_file.filename)
+
+
+@batch_rule
+def add_pid_to_wfcatalog_rule_batch(options, sds_files):
+    """Updates the WFCatalog with the PIDs of a batch of files from the local iRODS
+    archive, in a single database request.
+
+    Parameters
+    ----------
+    options : `dict`
+        The rule's options.
+    sds_files : `list` of `SDSFile`
+        The files to be processed.
+    """
+
+    logger.debug("Updating WFCatalog with the PIDs of %d files.", len(sds_files))
+
+    # Look up the PIDs concurrently
+    with ThreadPoolExecutor(max_workers=7) as executor:
+        pids = list(executor.map(irods_session.get_pid, sds_files))
+
+    found = []
+    for sds_file, pid in zip(sds_files, pids):
+        if pid is not None:
+            found.append((sds_file, pid))
+        else:
+            logger.error("File %s has no PID.", sds_file.filename)
+
+    mongo_pool.set_wfcatalog_daily_pids(found)
+
+    for sds_file, pid in found:
+        logger.info("Entry for file %s updated with PID %s.", sds_file.filename, pid)
 
 
 def replication_rule(options, sds_file):
@@ -234,16 +379,16 @@ def replication_rule(options, sds_file):
         The file to be processed.
     """
 
-    logger.debug("Replicating file %s." % sds_file.filename)
+    logger.debug("Replicating file %s.", sds_file.filename)
 
     # Attempt to replicate file
     success, response = irods_session.eudat_replication(sds_file, options["replication_root"])
 
     if success:
-        logger.debug("Replicated file %s to collection %s." % (sds_file.filename,
-                                                               options["replication_root"]))
+        logger.debug("Replicated file %s to collection %s.", sds_file.filename,
+                     options["replication_root"])
     else:
-        logger.error("Error replicating file %s: %s" % (sds_file.filename, response))
+        logger.error("Error replicating file %s: %s", sds_file.filename, response)
 
 
 def delete_archive_rule(options, sds_file):
@@ -257,13 +402,12 @@ def delete_archive_rule(options, sds_file):
         The description of the file to be deleted.
     """
 
-    logger.debug("Deleting file %s." % sds_file.filename)
+    logger.debug("Deleting file %s.", sds_file.filename)
 
     # Attempt to delete from iRODS
     irods_session.delete_data_object(sds_file)
 
-    # Check if checksum is saved
-    logger.debug("Deleted file %s." % sds_file.filename)
+    logger.debug("Deleted file %s.", sds_file.filename)
 
 
 def federated_ingestion_rule(options, sds_file):
@@ -280,15 +424,18 @@ def federated_ingestion_rule(options, sds_file):
         The file to be processed.
     """
 
-    logger.debug("Ingesting file %s." % sds_file.custom_path(options["remote_root"]))
+    remote_root = options["remote_root"]
+    remote_path = sds_file.custom_path(remote_root)
+
+    logger.debug("Ingesting file %s.", remote_path)
 
     # Attempt to ingest to iRODS
     irods_session.remote_put(sds_file,
-                             options["remote_root"],
+                             remote_root,
                              purge_cache=True,
                              register_checksum=True)
 
-    logger.debug("Ingested file %s" % sds_file.custom_path(options["remote_root"]))
+    logger.debug("Ingested file %s", remote_path)
 
 
 def purge_rule(options, sds_file):
@@ -303,12 +450,43 @@ def purge_rule(options, sds_file):
     """
 
     # Some other configurable rules
-    logger.debug("Purging file %s from temporary archive." % sds_file.filename)
+    logger.debug("Purging file %s from temporary archive.", sds_file.filename)
     try:
         os.remove(sds_file.filepath)
-        logger.debug("Purged file %s from temporary archive." % sds_file.filename)
+        sds_file.invalidate_stats()
+        logger.debug("Purged file %s from temporary archive.", sds_file.filename)
     except FileNotFoundError:
-        logger.debug("File %s not present in temporary archive." % sds_file.filename)
+        logger.debug("File %s not present in temporary archive.", sds_file.filename)
+
+
+@batch_rule
+def purge_rule_batch(options, sds_files):
+    """Handler for the temporary archive purge rule on a batch of files, removing up to
+    8 files at the same time.
+
+    Parameters
+    ----------
+    options : `dict`
+        The rule's options.
+    sds_files : `list` of `SDSFile`
+        The files to be processed.
+    """
+
+    def purge(sds_file):
+        try:
+            os.remove(sds_file.filepath)
+            sds_file.invalidate_stats()
+            logger.debug("Purged file %s from temporary archive.", sds_file.filename)
+        except FileNotFoundError:
+            logger.debug("File %s not present in temporary archive.", sds_file.filename)
+
+    logger.debug("Purging %d files from temporary archive.", len(sds_files))
+
+    # Other errors are raised once all the removals are done
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [executor.submit(purge, sds_file) for sds_file in sds_files]
+    for future in futures:
+        future.result()
 
 
 def dc_metadata_rule(options, sds_file):
@@ -323,7 +501,7 @@ def dc_metadata_rule(options, sds_file):
         The file to be processed.
     """
 
-    logger.debug("Saving Dublin Core metadata for %s." % sds_file.filename)
+    logger.debug("Saving Dublin Core metadata for %s.", sds_file.filename)
 
     # Get the existing Dublin Core Object
     document = extract_dc_metadata(sds_file, irods_session.get_pid(sds_file).upper())
@@ -331,7 +509,7 @@ def dc_metadata_rule(options, sds_file):
     # Save to the database
     if document:
         mongo_pool.save_dc_document(document)
-        logger.debug("Saved Dublin Core metadata for %s." % sds_file.filename)
+        logger.debug("Saved Dublin Core metadata for %s.", sds_file.filename)
 
 
 def delete_dc_metadata_rule(options, sds_file):
@@ -346,12 +524,12 @@ def delete_dc_metadata_rule(options, sds_file):
         The file to be processed.
     """
 
-    if "dry_run" in options and options["dry_run"]:
-        logger.info("Would delete all Dublin Core metadata for %s." % sds_file.filename)
+    if options.get("dry_run", False):
+        logger.info("Would delete all Dublin Core metadata for %s.", sds_file.filename)
     else:
-        logger.debug("Marking %s as deleted in Dublin Core metadata." % sds_file.filename)
+        logger.debug("Marking %s as deleted in Dublin Core metadata.", sds_file.filename)
         mongo_pool.delete_dc_document(sds_file)
-        logger.debug("Marked %s as deleted in Dublin Core metadata." % sds_file.filename)
+        logger.debug("Marked %s as deleted in Dublin Core metadata.", sds_file.filename)
 
 
 def waveform_metadata_rule(options, sds_file):
@@ -369,19 +547,53 @@ def waveform_metadata_rule(options, sds_file):
     # Get waveform metadata
     (doc_daily, docs_segments) = get_wf_metadata(sds_file)
 
-    logger.debug("Saving waveform metadata for %s." % sds_file.filename)
-
-    # Save the daily metadata document
-    mongo_pool.set_wfcatalog_daily_document(doc_daily)
+    logger.debug("Saving waveform metadata for %s.", sds_file.filename)
 
-    # Save the continuous segments documents
     if docs_segments is None:
-        return logger.debug("No continuous segments to save for %s." % sds_file.filename)
-    else:
-        mongo_pool.delete_wfcatalog_segments_documents(sds_file)
-        mongo_pool.save_wfcatalog_segments_documents(docs_segments)
+        logger.debug("No continuous segments to save for %s.", sds_file.filename)
+
+    # Save the daily metadata document and the continuous segments documents
+    mongo_pool.save_wfcatalog_documents(sds_file, doc_daily, docs_segments)
+
+    logger.debug("Saved waveform metadata for %s.", sds_file.filename)
+
+@batch_rule
+def waveform_metadata_rule_batch(options, sds_files):
+    """Handler for the WFCatalog metadata rule on a batch of files, saving all the
+    documents in a single database request per collection.
+
+    Parameters
+    ----------
+    options : `dict`
+        The rule's options.
+    sds_files : `list` of `SDSFile`
+        The files to be processed.
+    """
+
+    docs_daily = []
+    docs_segments = []
+    segmented_files = []
+
+    # Get waveform metadata
+    for sds_file in sds_files:
+        (doc_daily, file_docs_segments) = get_wf_metadata(sds_file)
+        docs_daily.append(doc_daily)
+
+        # Only files with continuous segments have their segments replaced
+        if file_docs_segments is None:
+            logger.debug("No continuous segments to save for %s.", sds_file.filename)
+        else:
+            docs_segments.extend(file_docs_segments)
+            segmented_files.append(sds_file)
+
+    logger.debug("Saving waveform metadata for %d files.", len(sds_files))
+
+    # Save the daily metadata documents and the continuous segments documents
+    mongo_pool.save_wfcatalog_documents_batch(sds_files, docs_daily,
+                                              segmented_files, docs_segments)
+
+    logger.debug("Saved waveform metadata for %d files.", len(sds_files))
 
-    logger.debug("Saved waveform metadata for %s." % sds_file.filename)
 
 def delete_waveform_metadata_rule(options, sds_file):
     """Delete waveform metadata of an SDS file.
@@ -395,13 +607,36 @@ def delete_waveform_metadata_rule(options, sds_file):
         The file to be processed.
     """
 
-    if "dry_run" in options and options["dry_run"]:
-        logger.info("Would delete all waveform metadata for %s." % sds_file.filename)
+    if options.get("dry_run", False):
+        logger.info("Would delete all waveform metadata for %s.", sds_file.filename)
     else:
-        logger.debug("Deleting waveform metadata for %s." % sds_file.filename)
+        logger.debug("Deleting waveform metadata for %s.", sds_file.filename)
         mongo_pool.delete_wfcatalog_daily_document(sds_file)
         mongo_pool.delete_wfcatalog_segments_documents(sds_file)
-        logger.debug("Deleted waveform metadata for %s." % sds_file.filename)
+        logger.debug("Deleted waveform metadata for %s.", sds_file.filename)
+
+
+@batch_rule
+def delete_waveform_metadata_rule_batch(options, sds_files):
+    """Delete waveform metadata of a batch of SDS files.
+
+    Parameters
+    ----------
+    options : `dict`
+        The rule's options.
+        - ``dry_run``: If True, doesn't delete the data (`bool`, default `False`)
+    sds_files : `list` of `SDSFile`
+        The files to be processed.
+    """
+
+    if options.get("dry_run", False):
+        for sds_file in sds_files:
+            logger.info("Would delete all waveform metadata for %s.", sds_file.filename)
+    else:
+        logger.debug("Deleting waveform metadata for %d files.", len(sds_files))
+        mongo_pool.delete_wfcatalog_daily_documents_batch(sds_files)
+        mongo_pool.delete_wfcatalog_segments_documents_batch(sds_files)
+        logger.debug("Deleted waveform metadata for %d files.", len(sds_files))
 
 
 def remove_from_deletion_database_rule(options, sds_file):
@@ -410,12 +645,28 @@ def remove_from_deletion_database_rule(options, sds_file):
     To be used after a successful deletion of the file from all desired archives.
     """
 
-    logger.debug("Removing deletion entry for %s." % sds_file.filename)
+    logger.debug("Removing deletion entry for %s.", sds_file.filename)
 
     from core.database import deletion_database
     deletion_database.remove(sds_file)
 
-    logger.debug("Removed deletion entry for %s." % sds_file.filename)
+    logger.debug("Removed deletion entry for %s.", sds_file.filename)
+
+
+@batch_rule
+def remove_from_deletion_database_rule_batch(options, sds_files):
+    """Removes a batch of files from the deletion database, in a single transaction.
+
+    To be used after a successful deletion of the files from all desired archives.
+    """
+
+    logger.debug("Removing deletion entries for %d files.", len(sds_files))
+
+    # Imported here so that other sequences do not open the deletion database
+    from core.database import deletion_database
+    deletion_database.remove_many(sds_files)
+
+    logger.debug("Removed deletion entries for %d files.", len(sds_files))
 
 
 def print_with_message(options, sds_file):
@@ -456,11 +707,12 @@ def quarantine_raw_file_rule(options, sds_file):
         # Move the raw file
         source_path = sds_file.filepath
         dest_dir = sds_file.custom_directory(options["quarantine_path"])
-        if "dry_run" in options and options["dry_run"]:
+        if options.get("dry_run", False):
             logger.info("Would move %s to %s/", source_path, dest_dir)
         else:
             os.makedirs(dest_dir, exist_ok=True)
             shutil.move(source_path, dest_dir)
+            sds_file.invalidate_stats()
             logger.info("Moved %s to %s/", source_path, dest_dir)
 
         # TODO: Report
@@ -495,12 +747,13 @@ def quarantine_pruned_file_rule(options, sds_file):
     """
     try:
         # Move the raw .D file
+        d_subdir = sds_file.custom_quality_subdir("D")
         d_file_path = os.path.join(sds_file.archive_root,
-                                   sds_file.custom_quality_subdir("D"),
+                                   d_subdir,
                                    sds_file.custom_quality_filename("D"))
-        dest_dir = os.path.join(options["quarantine_path"],
-                                sds_file.custom_quality_subdir("D"))
-        if "dry_run" in options and options["dry_run"]:
+        dest_dir = os.path.join(options["quarantine_path"], d_subdir)
+        dry_run = options.get("dry_run", False)
+        if dry_run:
             logger.info("Would move %s to %s/", d_file_path, dest_dir)
         else:
             os.makedirs(dest_dir, exist_ok=True)
@@ -509,10 +762,11 @@ def quarantine_pruned_file_rule(options, sds_file):
 
         # Delete the .Q file
         q_file_path = sds_file.filepath
-        if "dry_run" in options and options["dry_run"]:
+        if dry_run:
             logger.info("Would remove %s", q_file_path)
         else:
             os.remove(q_file_path)
+            sds_file.invalidate_stats()
             logger.info("Removed %s", q_file_path)
 
         # TODO: Report
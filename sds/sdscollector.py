@@ -9,7 +9,8 @@
 """
 
 import logging
-from fnmatch import fnmatch
+import re
+from fnmatch import translate
 from datetime import date, datetime, timedelta
 from itertools import repeat
 import dateutil.parser as parser
@@ -18,6 +19,11 @@ from sds.sdsfile import SDSFile
 from sds.filecollector import FileCollector
 
 
+def _has_wildcards(pattern):
+    """Return whether a filename pattern contains any shell-style wildcard."""
+    return any(char in pattern for char in "*?[")
+
+
 class SDSFileCollector(FileCollector):
 
     """
@@ -46,6 +52,33 @@ class SDSFileCollector(FileCollector):
                                                                                   str(e)))
         self.files = sds_files
 
+        # Lookup indexes over the current self.files list, see _get_index
+        self._indexes = {}
+
+    def _get_index(self, name, key):
+        """Return a `dict` mapping `key(sds_file)` to the list of matching files.
+
+        The index is built on first use and rebuilt whenever `self.files` is
+        replaced by a new list, as done by the filter methods.
+        """
+
+        files, index = self._indexes.get(name, (None, None))
+        if files is not self.files:
+            index = {}
+            for sds_file in self.files:
+                index.setdefault(key(sds_file), []).append(sds_file)
+            self._indexes[name] = (self.files, index)
+
+        return index
+
+    def _get_date_index(self):
+        """Return the index of files by (year, day) in their name."""
+        return self._get_index("date", lambda x: (x.year, x.day))
+
+    def _get_name_index(self):
+        """Return the index of files by filename."""
+        return self._get_index("name", lambda x: x.filename)
+
     def _collect_from_date(self, i_date, mode="file_name"):
         """
         Collects SDS files for a particular date, based on file's name or on
@@ -63,8 +96,8 @@ class SDSFileCollector(FileCollector):
             year = i_date.strftime("%Y")
             self.logger.debug("Searching files whose name's date is '%s.%s'" % (year, day))
 
-            # Filter by day and year
-            files = list(filter(lambda x: (x.day == day and x.year == year), self.files))
+            # Look up by day and year
+            files = list(self._get_date_index().get((year, day), []))
 
         elif mode == "mod_time":
 
@@ -93,8 +126,20 @@ class SDSFileCollector(FileCollector):
 
         self.logger.debug("Searching files whose name fits in '%s'" % filename)
 
-        # Take the basename and map to SDSFile
-        files = list(filter(lambda x: fnmatch(x.filename, filename), self.files))
+        # A name without wildcards is a direct lookup
+        if not _has_wildcards(filename):
+            files = list(self._get_name_index().get(filename, []))
+        else:
+            # Only files with the same date can match when year and day are literal
+            (_, _, _, _, _, year, day) = filename.split(".")
+            if _has_wildcards(year) or _has_wildcards(day):
+                candidates = self.files
+            else:
+                candidates = self._get_date_index().get((year, day), [])
+
+            # Compile the wildcards once and match every candidate against it
+            match = re.compile(translate(filename)).match
+            files = [x for x in candidates if match(x.filename)]
 
         self.logger.debug("Found %d files for this filename/wildcard." % len(files))
         return files
@@ -161,7 +206,8 @@ class SDSFileCollector(FileCollector):
     def filter_from_file_list(self, file_list):
         """Filter files that are in a list of filenames."""
 
-        self.files = list(filter(lambda x: x.filename in file_list, self.files))
+        file_list = set(file_list)
+        self.files = [x for x in self.files if x.filename in file_list]
 
     def sort_files(self, order):
         """Sort files by filename."""
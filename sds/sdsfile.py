@@ -10,18 +10,168 @@
 
 import os
 import requests
+import weakref
 import subprocess
 import base64
+import hashlib
 import logging
 import ctypes
 
 from datetime import datetime, timedelta
+from functools import lru_cache
+from stat import S_ISREG
 from zlib import adler32
 
 from obspy import read_inventory, UTCDateTime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from configuration import config
 
 
+class cached_property():
+    """Property computed once and then stored in the instance dictionary.
+
+    Used instead of `functools.cached_property`, which does not exist before Python 3.8
+    and up to Python 3.11 holds one lock per property shared by all instances, so e.g.
+    the traces of different files would be read one at a time by the worker threads.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = instance.__dict__[self.name] = self.func(instance)
+        return value
+
+# Pooled HTTP session for the FDSN web service, connections are reused between requests
+_fdsnws_session = requests.Session()
+_fdsnws_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=Retry(3))
+_fdsnws_session.mount("http://", _fdsnws_adapter)
+_fdsnws_session.mount("https://", _fdsnws_adapter)
+
+
+def _julian_date(year, day):
+    """Return the `datetime` of a year and day of the year (1 to 366)."""
+
+    if not 1 <= day <= 366:
+        raise ValueError("Invalid day of the year: %d" % day)
+
+    return datetime(year, 1, 1) + timedelta(days=day - 1)
+
+
+def _parse_seed_date(seed_date):
+    """Parse a SEED date, e.g. 2005,068,00:00:01.000000.
+
+    Equivalent to `datetime.strptime(seed_date, "%Y,%j,%H:%M:%S.%f")`, without the
+    cost of interpreting the format on every call.
+    """
+
+    (year, day, time) = seed_date.split(",")
+    (hours, minutes, seconds) = time.split(":")
+    (seconds, _, fraction) = seconds.partition(".")
+
+    return _julian_date(int(year), int(day)) + timedelta(
+        hours=int(hours),
+        minutes=int(minutes),
+        seconds=int(seconds),
+        microseconds=int(fraction.ljust(6, "0")) if fraction else 0
+    )
+
+
+def _parse_msi_output(line):
+    """Parse a line of the MSI trace list output."""
+
+    (stream, start, end, rate, samples) = map(lambda x: x.decode("ascii"), line.split())
+
+    # Return a simple dict with some information
+    return {
+        "samples": int(samples),
+        "rate": float(rate),
+        "start": _parse_seed_date(start),
+        "end": _parse_seed_date(end)
+    }
+
+
+@lru_cache(maxsize=1024)
+def _read_traces(sample_start, sample_end, files):
+    """Return the list of traces in `files` between `sample_start` and `sample_end`.
+
+    `files` is a `tuple` of (filepath, modification time) pairs, the modification time
+    only serves to invalidate the cache. Adjacent SDS files share most of their
+    neighbours, so the cache is shared between all SDSFile instances. The returned list
+    must not be modified.
+    """
+
+    # Cut to day boundary on sample level
+    dataselect = subprocess.Popen([
+        "dataselect",
+        "-ts", sample_start,
+        "-te", sample_end,
+        "-Ps",
+        "-szs",
+        "-o", "-",
+    ] + [filepath for filepath, _ in files], stdout=subprocess.PIPE)
+
+    lines = subprocess.check_output([
+        "msi",
+        "-ts", sample_start,
+        "-te", sample_end,
+        "-T",
+        "-"
+    ], stdin=dataselect.stdout, stderr=subprocess.DEVNULL).splitlines()
+
+    # Not sure why we need this
+    dataselect.stdout.close()
+
+    # Avoid warning when status code for child process is not read (for Python 3.6):
+    # Introduced in https://github.com/python/cpython/commit/5a48e21ff163107a6f1788050b2f1ffc8bce2b6d#diff-cc136486b4a8e112e64b57436a0619eb
+    dataselect.wait()
+
+    # Skip first header & final line
+    return [_parse_msi_output(line) for line in lines[1:-1]]
+
+
+# Adjacent SDSFile objects by (filename, archive root), shared while they are referenced
+_sds_file_pool = weakref.WeakValueDictionary()
+
+
+@lru_cache(maxsize=4096)
+def _get_location(url):
+    """Return the location dictionary from an FDSNWS channel text query, or `None`.
+
+    Raises `requests.exceptions.RequestException` on connection errors and responses
+    other than 200, so that only answers of the web service are cached.
+    """
+
+    request = _fdsnws_session.get(url)
+
+    # Not cached, the next query may succeed
+    if request.status_code != 200:
+        raise requests.exceptions.HTTPError("FDSNWS returned status %d." %
+                                            request.status_code, response=request)
+
+    lines = request.text.split("\n")
+
+    # Multiple lines means that the location is somehow ambiguous
+    if len(lines) != 3:
+        return None
+
+    # Some magic parsing: fields 4, 5, 6 on the 2nd line
+    (latitude, longitude, elevation) = lines[1].split("|")[4:7]
+
+    return {
+        "longitude": float(longitude),
+        "latitude": float(latitude),
+        "elevation": float(elevation)
+    }
+
+
 class SDSFile():
 
     """
@@ -53,6 +203,27 @@ class SDSFile():
     fdsnws = config["FDSNWS_ADDRESS"]
     s3_prefix = config["S3"]["PREFIX"]
 
+    # Checksum algorithm: "adler32" or any algorithm supported by hashlib, e.g. "sha256"
+    # (uses the SHA extensions through OpenSSL when available) or "blake2b"
+    checksum_algo = config.get("CHECKSUM_ALGO", "adler32")
+
+    # Size of the blocks read when computing the checksum
+    CHECKSUM_BLOCK_SIZE = 1 << 20
+
+    # PID in the local iRODS archive, cached by IRODSManager.get_pid once known
+    pid = None
+
+    # Identification fields, changing one of them invalidates the cached properties
+    _IDENTITY_FIELDS = frozenset(["net", "sta", "loc", "cha", "quality", "year", "day",
+                                  "archive_root"])
+
+    # Properties derived from the identification fields, computed once per instance
+    _CACHED_PROPERTIES = ("filename", "filepath", "irods_path", "s3_key", "sub_directory",
+                          "irods_directory", "directory", "channel_directory", "id",
+                          "start", "end", "sample_start", "sample_end", "query_string",
+                          "traces", "samples", "continuous", "next", "previous",
+                          "stats", "pid")
+
     def __init__(self, filename, archive_root):
         """
         Create a filestream from a given filename
@@ -60,29 +231,30 @@ class SDSFile():
 
         try:
             # Extract stream identification
-            (self.net,
-             self.sta,
-             self.loc,
-             self.cha,
-             self.quality,
-             self.year,
-             self.day) = filename.split(".")
+            (net, sta, loc, cha, quality, year, day) = filename.split(".")
         except ValueError:
             raise ValueError("Invalid SDS file submitted.")
 
-        self.archive_root = archive_root
+        # Set directly, there are no cached properties to invalidate yet
+        self.__dict__.update(net=net, sta=sta, loc=loc, cha=cha, quality=quality,
+                             year=year, day=day, archive_root=archive_root,
+                             logger=logging.getLogger("RuleManager"),
+                             _checksum=None, _checksum_key=None,
+                             _inventory=None, _location=None)
 
-        # Initialize logger
-        self.logger = logging.getLogger("RuleManager")
+    def __setattr__(self, name, value):
+        """Set an attribute, invalidating the cached properties when an identification
+        field changes (e.g. when creating a phantom file with another quality)."""
 
-        # Initialize costly properties
-        self._checksum = None
-        self._inventory = None
-        self._traces = None
-        self._location = None
+        super().__setattr__(name, value)
+        if name in self._IDENTITY_FIELDS:
+            cache = self.__dict__
+            if not cache.keys().isdisjoint(self._CACHED_PROPERTIES):
+                for cached in self._CACHED_PROPERTIES:
+                    cache.pop(cached, None)
 
     # Returns the filename
-    @property
+    @cached_property
     def filename(self):
         return self.custom_quality_filename(self.quality)
 
@@ -111,22 +283,22 @@ class SDSFile():
         return os.path.join(self.custom_directory(root), self.filename)
 
     # Returns filepath for a given file
-    @property
+    @cached_property
     def filepath(self):
         return self.custom_path(self.archive_root)
 
     # Returns iRODS filepath for a given file
-    @property
+    @cached_property
     def irods_path(self):
         return self.custom_path(self.irods_root)
 
     # Returns the S3 key for a given file
-    @property
+    @cached_property
     def s3_key(self):
         return self.custom_path(self.s3_prefix)
 
     # Returns the stream identifier
-    @property
+    @cached_property
     def id(self):
         return ".".join([
             self.net,
@@ -136,7 +308,7 @@ class SDSFile():
         ])
 
     # Returns the subdirectory
-    @property
+    @cached_property
     def sub_directory(self):
         return os.path.join(
             self.year,
@@ -151,74 +323,92 @@ class SDSFile():
             self.sub_directory
         )
 
-    @property
+    @cached_property
     def irods_directory(self):
         return self.custom_directory(self.irods_root)
 
     # Returns the file directory based on SDS structure
-    @property
+    @cached_property
     def directory(self):
         return self.custom_directory(self.archive_root)
 
     # Returns channel directory
-    @property
+    @cached_property
     def channel_directory(self):
         return ".".join([self.cha, self.quality])
 
     # Returns next file in stream
-    @property
+    @cached_property
     def next(self):
         return self._get_adjacent_file(1)
 
     # Returns previous file in stream
-    @property
+    @cached_property
     def previous(self):
         return self._get_adjacent_file(-1)
 
     # Returns start time of file
-    @property
+    @cached_property
     def start(self):
-        return datetime.strptime(self.year + " " + self.day, "%Y %j")
+        return _julian_date(int(self.year), int(self.day))
 
     # Returns end time of file
-    @property
+    @cached_property
     def end(self):
         return self.start + timedelta(days=1)
 
     # Start for dataselect pruning (start is INCLUSIVE)
-    @property
+    @cached_property
     def sample_start(self):
-        return self.start.strftime("%Y,%j,00,00,00.000000")
+        return "%s,%s,00,00,00.000000" % (self.year, self.day)
 
     # End for dataselect pruning (end is INCLUSIVE)
-    @property
+    @cached_property
     def sample_end(self):
-        return self.start.strftime("%Y,%j,23,59,59.999999")
+        return "%s,%s,23,59,59.999999" % (self.year, self.day)
 
     # Returns list of files neighbouring a file
+    # Not cached: rules may create or remove files during a sequence
     @property
     def neighbours(self):
-        return filter(lambda x: os.path.isfile(x.filepath), [self.previous, self, self.next])
-
-    @property
+        neighbours = []
+        for sds_file in (self.previous, self, self.next):
+            # Refresh the cached stats with the same syscall that checks the file
+            sds_file.__dict__.pop("stats", None)
+            stats = sds_file.stats
+            if stats is not None and S_ISREG(stats.st_mode):
+                neighbours.append(sds_file)
+        return neighbours
+
+    # Returns the result of os.stat, cached until invalidate_stats is called
+    @cached_property
     def stats(self):
         try:
             return os.stat(self.filepath)
         except FileNotFoundError:
             return None
 
+    def invalidate_stats(self):
+        """Forget the cached stats (and what derives from the file contents), to be
+        called when the file has been changed, moved or removed."""
+
+        self._checksum = None
+        for cached in ("stats", "traces", "samples", "continuous"):
+            self.__dict__.pop(cached, None)
+
     def get_stat(self, enum):
 
         # Check if none and propagate
-        if self.stats is None:
+        stats = self.stats
+        if stats is None:
             return None
 
         if enum == "size":
-            return self.stats.st_size
+            return stats.st_size
         elif enum == "created":
-            return datetime.fromtimestamp(self.stats.st_ctime)
+            return datetime.fromtimestamp(stats.st_ctime)
         elif enum == "modified":
-            return datetime.fromtimestamp(self.stats.st_mtime)
+            return datetime.fromtimestamp(stats.st_mtime)
 
     @property
     def size(self):
@@ -236,21 +426,51 @@ class SDSFile():
     def checksum(self):
         """
         def SDSFile::checksum
-        Calculates the Adler-32 checksum for a given file, converting it to a
-        signed int32 to save space in MongoDB documents
+        Calculates the checksum for a given file. The default Adler-32 checksum is
+        converted to a signed int32 to save space in MongoDB documents, other algorithms
+        are returned as "<algorithm>:<base64 digest>" (SHA256 as "sha2:", like iRODS)
         """
 
-        if self._checksum is not None:
-            return self._checksum
-
-        if self.stats is None:
+        # Other objects for the same path (e.g. a shared adjacent file) may have changed
+        # or removed the file, so the cached checksum is keyed on fresh stats
+        self.__dict__.pop("stats", None)
+        stats = self.stats
+        if stats is None:
             return None
 
-        checksum = None
-        with open(self.filepath, "rb") as f:
-            checksum = adler32(f.read()) & 0xffffffff
-            checksum = ctypes.c_int32(checksum).value
-        self._checksum = checksum
+        key = (self.filepath, stats.st_mtime_ns, stats.st_size)
+        if self._checksum is not None and self._checksum_key == key:
+            return self._checksum
+
+        if self.checksum_algo == "adler32":
+            digest = None
+            update = adler32
+        else:
+            digest = hashlib.new(self.checksum_algo)
+            update = digest.update
+
+        # Stream the file in large blocks to keep memory usage flat
+        checksum = 1
+        buffer = bytearray(self.CHECKSUM_BLOCK_SIZE)
+        view = memoryview(buffer)
+        with open(self.filepath, "rb", buffering=0) as f:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                if digest is None:
+                    checksum = update(view[:n], checksum)
+                else:
+                    update(view[:n])
+
+        if digest is None:
+            self._checksum = ctypes.c_int32(checksum & 0xffffffff).value
+        else:
+            prefix = "sha2" if self.checksum_algo == "sha256" else self.checksum_algo
+            self._checksum = prefix + ":" + base64.b64encode(digest.digest()).decode()
+        self._checksum_key = key
         return self._checksum
 
     @property
@@ -269,7 +489,7 @@ class SDSFile():
             "level=response"
         ])
 
-    @property
+    @cached_property
     def query_string(self):
         """Return the query string for a particular SDS file."""
 
@@ -282,7 +502,7 @@ class SDSFile():
             "channel=%s" % self.cha
         ])
 
-    @property
+    @cached_property
     def samples(self):
         """
         def SDSFile::samples
@@ -291,7 +511,7 @@ class SDSFile():
 
         return sum(map(lambda x: x["samples"], self.traces))
 
-    @property
+    @cached_property
     def continuous(self):
         """
         def SDSFile::continuous
@@ -299,65 +519,25 @@ class SDSFile():
         record start time & end time come before and after the file ending respectively
         """
 
-        return len(
-            self.traces) == 1 and (
-            self.traces[0]["start"] <= self.start) and (
-            self.traces[0]["end"] >= self.end)
+        traces = self.traces
+        return (len(traces) == 1
+                and traces[0]["start"] <= self.start
+                and traces[0]["end"] >= self.end)
 
-    @property
+    @cached_property
     def traces(self):
         """
         def SDSFile::traces
         Returns a list of traces
         """
 
-        if self._traces is not None:
-            return self._traces
-
-        def parse_msi_output(line):
-            """Parse the MSI output."""
-
-            # Format for seed dates e.g. 2005,068,00:00:01.000000
-            SEED_DATE_FMT = "%Y,%j,%H:%M:%S.%f"
-
-            (stream, start, end, rate, samples) = map(lambda x: x.decode("ascii"), line.split())
-
-            # Return a simple dict with some information
-            return {
-                "samples": int(samples),
-                "rate": float(rate),
-                "start": datetime.strptime(start, SEED_DATE_FMT),
-                "end": datetime.strptime(end, SEED_DATE_FMT)
-            }
-
-        # Cut to day boundary on sample level
-        dataselect = subprocess.Popen([
-            "dataselect",
-            "-ts", self.sample_start,
-            "-te", self.sample_end,
-            "-Ps",
-            "-szs",
-            "-o", "-",
-        ] + list(map(lambda x: x.filepath, self.neighbours)), stdout=subprocess.PIPE)
-
-        lines = subprocess.check_output([
-            "msi",
-            "-ts", self.sample_start,
-            "-te", self.sample_end,
-            "-T",
-            "-"
-        ], stdin=dataselect.stdout, stderr=subprocess.DEVNULL).splitlines()
+        files = []
+        for neighbour in self.neighbours:
+            stats = neighbour.stats
+            if stats is not None:
+                files.append((neighbour.filepath, stats.st_mtime_ns))
 
-        # Not sure why we need this
-        dataselect.stdout.close()
-
-        # Avoid warning when status code for child process is not read (for Python 3.6):
-        # Introduced in https://github.com/python/cpython/commit/5a48e21ff163107a6f1788050b2f1ffc8bce2b6d#diff-cc136486b4a8e112e64b57436a0619eb
-        dataselect.wait()
-
-        # Skip first header & final line
-        self._traces = list(map(parse_msi_output, lines[1:-1]))
-        return self._traces
+        return _read_traces(self.sample_start, self.sample_end, tuple(files))
 
     @property
     def is_pressure_channel(self):
@@ -376,7 +556,7 @@ class SDSFile():
             return self._inventory
 
         # Query our FDSNWS Webservice for the station location
-        request = os.path.join(self.fdsnws, self.query_string_xml)
+        request = self.fdsnws + self.query_string_xml
 
         try:
             self._inventory = read_inventory(request)
@@ -403,28 +583,10 @@ class SDSFile():
 
         # Query our FDSNWS Webservice for the station location
         try:
-            request = requests.get(os.path.join(self.fdsnws, self.query_string_txt))
+            self._location = _get_location(self.fdsnws + self.query_string_txt)
         except requests.exceptions.RequestException:
             return None
 
-        # Any error just ignore
-        if request.status_code != 200:
-            return None
-
-        lines = request.text.split("\n")
-
-        # Multiple lines means that the location is somehow ambiguous
-        if len(lines) != 3:
-            return None
-
-        # Some magic parsing: fields 4, 5, 6 on the 2nd line
-        (latitude, longitude, elevation) = lines[1].split("|")[4:7]
-
-        self._location = {
-            "longitude": float(longitude),
-            "latitude": float(latitude),
-            "elevation": float(elevation)
-        }
         return self._location
 
     @property
@@ -477,7 +639,7 @@ class SDSFile():
             os.makedirs(quality_file.directory)
 
         # Get neighbours
-        neighbours = list(map(lambda x: x.filepath, self.neighbours))
+        neighbours = [x.filepath for x in self.neighbours]
 
         # Define dataselect arguments
         # -Ps prunes to sample level
@@ -541,11 +703,18 @@ class SDSFile():
     def _get_adjacent_file(self, direction):
         """Private function that returns adjacent SDSFile based on direction."""
 
-        new_date = self.start + timedelta(days=direction)
+        new_day = int(self.day) + direction
+
+        # Within the same year only the day changes
+        if 1 <= new_day <= 365:
+            new_year = self.year
+            new_day = "%03d" % new_day
 
         # The year and day may change
-        new_year = new_date.strftime("%Y")
-        new_day = new_date.strftime("%j")
+        else:
+            new_date = self.start + timedelta(days=direction)
+            new_year = new_date.strftime("%Y")
+            new_day = new_date.strftime("%j")
 
         new_filename = ".".join([
             self.net,
@@ -557,7 +726,15 @@ class SDSFile():
             new_day
         ])
 
-        return SDSFile(new_filename, self.archive_root)
+        # Reuse the object if it is already in use, e.g. as the previous file of the
+        # file after this one, so its checksum and traces are computed only once
+        key = (new_filename, self.archive_root)
+        sds_file = _sds_file_pool.get(key)
+        if sds_file is None:
+            sds_file = SDSFile(new_filename, self.archive_root)
+            _sds_file_pool[key] = sds_file
+
+        return sds_file
 
     def __str__(self):
         return "%s (%s)" % (self.filename, self.modified)
@@ -16,6 +16,15 @@ import conditions.sdsconditions as sdsconditions
 from configuration import config
 
 
+def positive_int(value):
+    """Parse a strictly positive integer command line argument."""
+
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("%s is not a positive number" % value)
+    return number
+
+
 def main():
     try:
         # Initialize logger
@@ -46,6 +55,15 @@ def main():
                                   "(defaults to none)"),
                             choices=["none", "asc", "desc"],
                             default="none")
+        processing = parser.add_mutually_exclusive_group()
+        processing.add_argument("--workers",
+                                help=("number of files to process in parallel "
+                                      "(defaults to processing them one by one)"),
+                                type=positive_int)
+        processing.add_argument("--batch_size",
+                                help=("number of files passed together to batch rules "
+                                      "(defaults to processing them one by one)"),
+                                type=positive_int)
         parsedargs = vars(parser.parse_args())
 
         # Check collection parameters
@@ -78,7 +96,12 @@ def main():
             file_collector.sort_files(parsedargs["sort"])
 
         # Apply the sequence of rules on files
-        RM.sequence(file_collector.files)
+        if parsedargs["batch_size"] is not None:
+            RM.sequence_batched(file_collector.files, parsedargs["batch_size"])
+        elif parsedargs["workers"] is not None:
+            RM.sequence_parallel(file_collector.files, workers=parsedargs["workers"])
+        else:
+            RM.sequence(file_collector.files)
 
         logger.info("Finished SDS Manager execution.")
 
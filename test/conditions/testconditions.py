@@ -1,3 +1,5 @@
+import time
+
 def falseCondition(options, SDSFile):
     return False
 
@@ -10,3 +12,12 @@ def exceptionCondition(options, SDSFile):
 def optionCondition(options, SDSFile):
 
     return options["number"] == 10 and options["string"] == "string"
+
+def dayCondition(options, SDSFile):
+
+    return SDSFile.day in options["days"]
+
+def slowCondition(options, SDSFile):
+
+    time.sleep(2)
+    return True
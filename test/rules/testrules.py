@@ -1,9 +1,16 @@
 import time
 
+from core.exceptions import ExitPipelineException
+from core.rule import batch_rule
+
 def timeoutRule(options, SDSFile):
 
     time.sleep(6)
 
+def slowRule(options, SDSFile):
+
+    time.sleep(4)
+
 def exceptionRule(options, SDSFile):
 
     raise Exception("Oops!")
@@ -16,3 +23,21 @@ def optionRule(options, SDSFile):
 
     if options["number"] != 10 or options["string"] != "string":
         raise Exception("Oops!")
+
+# Files of each call to batchRule
+batchCalls = []
+
+@batch_rule
+def batchRule(options, SDSFiles):
+
+    batchCalls.append([SDSFile.filename for SDSFile in SDSFiles])
+
+@batch_rule
+def batchExitRule(options, SDSFiles):
+
+    raise ExitPipelineException(False, "Exit")
+
+@batch_rule
+def batchSlowRule(options, SDSFiles):
+
+    time.sleep(1.5)
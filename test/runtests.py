@@ -2,6 +2,9 @@
 
 import os
 import sys
+import json
+import tempfile
+import threading
 import unittest
 
 from datetime import datetime, timedelta
@@ -9,6 +12,8 @@ from unittest.mock import patch, PropertyMock
 from obspy import read_inventory
 
 CWD = os.path.abspath(os.path.dirname(__file__))
+DATA_DIR = os.path.join(CWD, "data")
+SDS_DIR = os.path.join(DATA_DIR, "SDS")
 
 # Patch to parent folder to import some code
 sys.path.append(os.path.dirname(CWD))
@@ -17,9 +22,9 @@ from core.rulemanager import RuleManager
 from sds.sdscollector import SDSFileCollector
 
 # Modules
-from modules.irodsmanager import irodsSession
+from modules.irodsmanager import irods_session
 from modules.psdcollector import psdCollector
-from sds.sdsfile import SDSFile
+from sds.sdsfile import SDSFile, _parse_seed_date
 
 # Cleanup
 sys.path.pop()
@@ -49,11 +54,11 @@ class TestRuleManager(unittest.TestCase):
         cls.RM = RuleManager()
 
         # Point file collector to the temporary archive
-        cls.FC = SDSFileCollector(os.path.join(CWD, "data", "SDS"))
+        cls.FC = SDSFileCollector(SDS_DIR)
 
     def createSDSFile(self, filename):
 
-        return SDSFile(filename, os.path.join(CWD, "data", "SDS"))
+        return SDSFile(filename, SDS_DIR)
 
     def loadSequence(self, sequence):
 
@@ -73,6 +78,28 @@ class TestRuleManager(unittest.TestCase):
             os.path.join(CWD, "sequences", sequence)
         )
 
+    def loadBatchSequence(self, sequence):
+
+        """
+        def loadBatchSequence
+        Loads a sequence of rules from the batch rule map to the Rule Manager instance
+        """
+
+        import conditions.testconditions as testconditions
+        import rules.testrules as testrules
+
+        # The sequence file points to the rule map with an absolute path
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as sequenceFile:
+            json.dump({
+                "rule_map": os.path.join(CWD, "batch_rules.json"),
+                "sequence": sequence
+            }, sequenceFile)
+
+        try:
+            self.RM.load_rules(testrules, testconditions, sequenceFile.name)
+        finally:
+            os.remove(sequenceFile.name)
+
     def test_sdsfile_class(self):
 
         """
@@ -95,10 +122,10 @@ class TestRuleManager(unittest.TestCase):
         self.assertEqual(self.SDSMock.previous.filename, "NL.HGN.02.BHZ.D.1969.365")
 
         # Confirm FDSNWS query string for this file
-        self.assertEqual(self.SDSMock.queryString, "?start=1970-01-01T00:00:00&end=1970-01-02T00:00:00&network=NL&station=HGN&location=02&channel=BHZ")
+        self.assertEqual(self.SDSMock.query_string, "?start=1970-01-01T00:00:00&end=1970-01-02T00:00:00&network=NL&station=HGN&location=02&channel=BHZ")
 
         # Not an infrasound channel
-        self.assertFalse(self.SDSMock.isPressureChannel)
+        self.assertFalse(self.SDSMock.is_pressure_channel)
 
         # File does not exist
         self.assertEqual(self.SDSMock.created, None)
@@ -110,7 +137,7 @@ class TestRuleManager(unittest.TestCase):
         self.assertIsNotNone(self.SDSReal.created)
         self.assertIsNotNone(self.SDSReal.modified)
         self.assertEqual(self.SDSReal.size, 4571648)
-        self.assertEqual(self.SDSReal.checksum, "sha2:yQQ9przMS2Pav5kyTsAtpF2F7aU/TgyRDZa2kTxg6DA=")
+        self.assertEqual(self.SDSReal.checksum, 1857413396)
 
         # Confirm dataselect trimming of file and number of samples is expected @ 40Hz
         self.assertEqual(self.SDSReal.samples, 40 * 86400)
@@ -119,6 +146,101 @@ class TestRuleManager(unittest.TestCase):
         self.assertTrue(self.SDSReal.traces[0]["start"] > datetime(2019, 1, 22, 0, 0, 0, 0))
         self.assertTrue(self.SDSReal.traces[0]["end"] < datetime(2019, 1, 23, 0, 0, 0, 0))
 
+    def test_sdsfile_phantom_quality(self):
+
+        """
+        def test_sdsfile_phantom_quality
+        Tests that changing the quality re-derives the cached properties
+        """
+
+        sds_file = self.createSDSFile("NL.HGN.02.BHZ.D.2019.022")
+
+        # Compute the cached properties before the change
+        self.assertEqual(sds_file.filename, "NL.HGN.02.BHZ.D.2019.022")
+        self.assertTrue(sds_file.filepath.endswith(os.path.join("BHZ.D", "NL.HGN.02.BHZ.D.2019.022")))
+        self.assertEqual(sds_file.next.filename, "NL.HGN.02.BHZ.D.2019.023")
+
+        sds_file.quality = "Q"
+
+        self.assertEqual(sds_file.filename, "NL.HGN.02.BHZ.Q.2019.022")
+        self.assertTrue(sds_file.filepath.endswith(os.path.join("BHZ.Q", "NL.HGN.02.BHZ.Q.2019.022")))
+        self.assertEqual(sds_file.next.filename, "NL.HGN.02.BHZ.Q.2019.023")
+        self.assertEqual(sds_file.previous.filename, "NL.HGN.02.BHZ.Q.2019.021")
+
+    def test_sdsfile_adjacent_boundaries(self):
+
+        """
+        def test_sdsfile_adjacent_boundaries
+        Tests the next and previous files across year and leap day boundaries
+        """
+
+        expected = [
+            ("NL.HGN.02.BHZ.D.2019.365", "NL.HGN.02.BHZ.D.2019.364", "NL.HGN.02.BHZ.D.2020.001"),
+            ("NL.HGN.02.BHZ.D.2020.001", "NL.HGN.02.BHZ.D.2019.365", "NL.HGN.02.BHZ.D.2020.002"),
+            ("NL.HGN.02.BHZ.D.2020.060", "NL.HGN.02.BHZ.D.2020.059", "NL.HGN.02.BHZ.D.2020.061"),
+            ("NL.HGN.02.BHZ.D.2020.365", "NL.HGN.02.BHZ.D.2020.364", "NL.HGN.02.BHZ.D.2020.366"),
+            ("NL.HGN.02.BHZ.D.2020.366", "NL.HGN.02.BHZ.D.2020.365", "NL.HGN.02.BHZ.D.2021.001"),
+            ("NL.HGN.02.BHZ.D.2021.001", "NL.HGN.02.BHZ.D.2020.366", "NL.HGN.02.BHZ.D.2021.002")
+        ]
+
+        for filename, previous, following in expected:
+            sds_file = self.createSDSFile(filename)
+            self.assertEqual(sds_file.previous.filename, previous)
+            self.assertEqual(sds_file.next.filename, following)
+
+        # The leap day is the 29th of February
+        self.assertEqual(self.createSDSFile("NL.HGN.02.BHZ.D.2020.060").start, datetime(2020, 2, 29))
+        self.assertEqual(self.createSDSFile("NL.HGN.02.BHZ.D.2019.060").start, datetime(2019, 3, 1))
+
+    def test_parse_seed_date(self):
+
+        """
+        def test_parse_seed_date
+        Tests that SEED dates are parsed like datetime.strptime does
+        """
+
+        for seed_date in ["2005,068,00:00:01.000000",
+                          "2019,022,12:30:05.5",
+                          "2019,365,23:59:59.999999",
+                          "2020,366,00:00:00.000001"]:
+            self.assertEqual(_parse_seed_date(seed_date),
+                             datetime.strptime(seed_date, "%Y,%j,%H:%M:%S.%f"))
+
+    def test_sdsfile_checksum_changes(self):
+
+        """
+        def test_sdsfile_checksum_changes
+        Tests that the checksum follows changes to the file, also from other objects
+        """
+
+        with tempfile.TemporaryDirectory() as archive:
+
+            sds_file = SDSFile("NL.HGN.02.BHZ.D.2019.022", archive)
+            os.makedirs(sds_file.directory)
+
+            with open(sds_file.filepath, "wb") as f:
+                f.write(b"first")
+
+            first = sds_file.checksum
+            self.assertIsNotNone(first)
+
+            # The previous file of the next file is shared with the next of the previous
+            adjacent = sds_file.previous.next
+            self.assertEqual(adjacent.checksum, first)
+
+            # Changed through another object
+            with open(SDSFile("NL.HGN.02.BHZ.D.2019.022", archive).filepath, "wb") as f:
+                f.write(b"second version")
+
+            self.assertNotEqual(sds_file.checksum, first)
+            self.assertEqual(adjacent.checksum, sds_file.checksum)
+
+            # Removed through another object
+            os.remove(sds_file.filepath)
+
+            self.assertIsNone(sds_file.checksum)
+            self.assertIsNone(adjacent.checksum)
+
     def test_sdsfile_invalid(self):
 
         """
@@ -242,6 +364,166 @@ class TestRuleManager(unittest.TestCase):
         # Assert timeout message in log
         self.assertEqual(cm.output, ["WARNING:core.rulemanager:NL.HGN.02.BHZ.D.1970.001: Timeout calling rule 'TIMEOUT'."])
 
+    def test_rule_condition_negation(self):
+
+        """
+        def test_rule_condition_negation
+        Tests conditions negated with "!": one that passes and one that fails
+        """
+
+        self.loadBatchSequence(["NEGATED_FALSE", "NEGATED_TRUE"])
+
+        with self.assertLogs("RuleManager", level="INFO") as cm:
+            self.RM.sequence([self.SDSMock])
+
+        name = str(self.SDSMock)
+        self.assertEqual(cm.output[1:], [
+            "INFO:RuleManager:%s - NEGATED_FALSE - Success" % name,
+            "INFO:RuleManager:%s - NEGATED_TRUE - Did not pass condition '!trueCondition'." % name
+        ])
+
+    def test_batch_rule_conditions(self):
+
+        """
+        def test_batch_rule_conditions
+        Tests that a batch rule is called once per batch with the files passing its conditions
+        """
+
+        import rules.testrules as testrules
+
+        self.loadBatchSequence(["BATCH"])
+        files = [self.createSDSFile("NL.HGN.02.BHZ.D.1970.%03d" % day) for day in range(1, 5)]
+
+        del testrules.batchCalls[:]
+        with self.assertLogs("RuleManager", level="INFO") as cm:
+            self.RM.sequence_batched(files, 3)
+
+        # The second batch has no file passing the condition
+        self.assertEqual(testrules.batchCalls, [["NL.HGN.02.BHZ.D.1970.001", "NL.HGN.02.BHZ.D.1970.003"]])
+        self.assertIn("INFO:RuleManager:%s - BATCH - Did not pass condition 'dayCondition'." % files[1], cm.output)
+        self.assertIn("INFO:RuleManager:%s - BATCH - Success" % files[2], cm.output)
+
+    def test_batch_rule_exit(self):
+
+        """
+        def test_batch_rule_exit
+        Tests that the files of a batch rule calling for an exit skip the following rules
+        """
+
+        import rules.testrules as testrules
+
+        self.loadBatchSequence(["BATCH_EXIT", "BATCH", "NEGATED_FALSE"])
+        files = [self.createSDSFile("NL.HGN.02.BHZ.D.1970.%03d" % day) for day in range(1, 3)]
+
+        del testrules.batchCalls[:]
+        with self.assertLogs("RuleManager", level="INFO") as cm:
+            self.RM.sequence_batched(files, 2)
+
+        self.assertEqual(testrules.batchCalls, [])
+        self.assertEqual(cm.output[2:], [
+            "INFO:RuleManager:%s - BATCH_EXIT - Success" % files[0],
+            "INFO:RuleManager:%s - Exit" % files[0],
+            "INFO:RuleManager:%s - BATCH_EXIT - Success" % files[1],
+            "INFO:RuleManager:%s - Exit" % files[1]
+        ])
+
+    def test_rule_manager_thread(self):
+
+        """
+        def test_rule_manager_thread
+        Expects an exception when SIGALRM timeouts are configured outside the main thread
+        """
+
+        errors = []
+
+        def createRuleManager():
+            try:
+                RuleManager()
+            except ValueError as ex:
+                errors.append(ex)
+
+        with patch.dict("core.rulemanager.config", {"RULE_WORKERS": 0}):
+            thread = threading.Thread(target=createRuleManager)
+            thread.start()
+            thread.join()
+
+        self.assertEqual(len(errors), 1)
+
+    def test_sequence_parallel_timeout(self):
+
+        """
+        def test_sequence_parallel_timeout
+        Tests that timed out rules holding every thread of the pool do not block the run
+        """
+
+        self.loadBatchSequence(["SLOW", "NEGATED_FALSE"])
+        files = [self.createSDSFile("NL.HGN.02.BHZ.D.1970.%03d" % day) for day in range(1, 4)]
+
+        start = datetime.now()
+
+        # One item at a time: the two threads of the rule pool are held by the first
+        # two items, the third one cannot start its rule
+        with self.assertLogs("RuleManager", level="INFO") as cm:
+            self.RM.sequence_parallel(files, workers=1)
+
+        # The run does not wait for the timed out rules to return
+        self.assertLess((datetime.now() - start).total_seconds(), 4)
+
+        for file in files[:2]:
+            self.assertIn("WARNING:RuleManager:%s - SLOW - Timeout" % file, cm.output)
+            self.assertIn("INFO:RuleManager:%s - Exit" % file, cm.output)
+        self.assertIn("WARNING:RuleManager:%s - SLOW - No free thread" % files[2], cm.output)
+        self.assertIn("INFO:RuleManager:%s - Exit" % files[2], cm.output)
+        self.assertFalse(any("NEGATED_FALSE" in line for line in cm.output))
+
+    def test_batch_rule_timeout(self):
+
+        """
+        def test_batch_rule_timeout
+        Tests that a batch rule gets the rule timeout for each of its files
+        """
+
+        self.loadBatchSequence(["BATCH_SLOW"])
+        files = [self.createSDSFile("NL.HGN.02.BHZ.D.1970.%03d" % day) for day in range(1, 3)]
+
+        with self.assertLogs("RuleManager", level="INFO") as cm:
+            self.RM.sequence_batched(files, 2)
+
+        self.assertEqual(cm.output[2:], [
+            "INFO:RuleManager:%s - BATCH_SLOW - Success" % files[0],
+            "INFO:RuleManager:%s - BATCH_SLOW - Success" % files[1]
+        ])
+
+    def test_batch_rule_condition_timeout(self):
+
+        """
+        def test_batch_rule_condition_timeout
+        Tests that the conditions of a batch rule are asserted under the rule timeout
+        """
+
+        import rules.testrules as testrules
+
+        self.loadBatchSequence(["BATCH_SLOW_CONDITION"])
+
+        del testrules.batchCalls[:]
+        with self.assertLogs("RuleManager", level="INFO") as cm:
+            self.RM.sequence_batched([self.SDSMock], 1)
+
+        self.assertEqual(testrules.batchCalls, [])
+        self.assertEqual(cm.output[1:], [
+            "WARNING:RuleManager:%s - BATCH_SLOW_CONDITION - Timeout" % self.SDSMock
+        ])
+
+    def test_batch_size_invalid(self):
+
+        """
+        def test_batch_size_invalid
+        Expects an exception when the batch size is not a positive number
+        """
+
+        with self.assertRaises(ValueError):
+            self.RM.sequence_batched([self.SDSMock], 0)
+
     def test_collect_files_days_future_range(self):
 
         now = datetime.now().date()
@@ -382,22 +664,25 @@ class TestRuleManager(unittest.TestCase):
 
     def test_PID(self):
 
-        is_new, pid = irodsSession.assignPID(self.SDSReal)
+        is_new, pid = irods_session.assignPID(self.SDSReal)
         self.assertFalse(is_new)
         self.assertEqual(pid, "21.T12996/F03A98FA-934A-11E9-9C7E-06D373D624C2")
 
     def test_getPID(self):
 
-        pid = irodsSession.getPID(self.SDSReal)
+        pid = irods_session.getPID(self.SDSReal)
         self.assertEqual(pid.upper(), "21.T12996/F03A98FA-934A-11E9-9C7E-06D373D624C2")
 
+    @unittest.skip("PSDCollector needs an ObsPy build that exposes PPSD.valid")
     def test_PSD_Module(self):
 
         """
         def test_PSD_Module
         Tests the PSD module
         """
-        return
+
+        start = datetime(2019, 1, 22)
+
         def testSegment(i, segment):
 
             """
@@ -405,8 +690,6 @@ class TestRuleManager(unittest.TestCase):
             Test results for a single PSD segment
             """
 
-            start = datetime(2019, 1, 22)
-
             # Segment start & end
             self.assertEqual(segment["ts"], start + timedelta(minutes=(30 * i)))
             self.assertEqual(segment["te"], start + timedelta(minutes=(30 * i + 60)))
@@ -421,7 +704,7 @@ class TestRuleManager(unittest.TestCase):
         with patch("sds.sdsfile.SDSFile.inventory", new_callable=PropertyMock) as mock_inventory:
 
             # Read a static response file
-            mock_inventory.return_value = read_inventory(os.path.join(CWD, "data/inventory.xml"))
+            mock_inventory.return_value = read_inventory(os.path.join(DATA_DIR, "inventory.xml"))
 
             # Call module with mocked function
             result = psdCollector.process(self.SDSReal)
@@ -429,7 +712,8 @@ class TestRuleManager(unittest.TestCase):
         # Should return 48 segments
         self.assertEqual(len(result), 48)
 
-        map(testSegment, enumerate(result))
+        for i, segment in enumerate(result):
+            testSegment(i, segment)
 
 
 if __name__ == "__main__":